@@ -8,244 +8,445 @@ Description:    Python file for running MCTS.
 Source:         Adapted from https://ai-boson.github.io/mcts/
 """
 import numpy as np
-from collections import defaultdict
+import multiprocessing
+import os
 import chess
+import chess.polyglot
 import time
+import evaluation
+from move_encoding import encode_moves, decode_move, moves_from
+from rollout_engine import RolloutEngine
+from transposition_table import TranspositionTable
 
 
 
 
-class MCTS_Node():
+_PROMOTIONS = [chess.QUEEN, chess.ROOK, chess.BISHOP, chess.KNIGHT]
 
+# king starting square and the pawns kept in front of it until the king moves
+UNCASTLED_KING_PAWNS = {
+    chess.WHITE: (chess.E1, chess.BB_C2 | chess.BB_D2 | chess.BB_F2 | chess.BB_G2),
+    chess.BLACK: (chess.E8, chess.BB_C7 | chess.BB_D7 | chess.BB_F7 | chess.BB_G7),
+}
 
-    def __init__(self, state, reward_val, color, width_iter, depth_iter, start_time, parent=None, parent_action=None):
-        self.state = state
-        self.baseboard_state = chess.BaseBoard(state.board_fen())
-        self.parent = parent
-        self.parent_action = parent_action
-        self.children = []
-        self.num_visits = 0
-        self.results = defaultdict(int)
-        self.results[1] = 0
-        self.results[0] = 0
-        self.results[-1] = 0
-        #self.untried_actions = None
-        self.color = color
-        self.untried_actions = self.get_untried_actions()
-        self.reward_val = reward_val
-        self.width_iter = width_iter
-        self.max_width_iter = 20
-        self.depth_iter = depth_iter
-        self.max_depth_iter = 5
+
+def random_pseudo_legal_move(board):
+    """
+    returns a uniformly random pseudo-legal move from board, or None if there
+    are none. the moves are counted with bitboards, a set of target squares per
+    piece and per kind of pawn move, and only the chosen one is built instead of
+    the whole move list
+    """
+    turn = board.turn
+    own = board.occupied_co[turn]
+    empty = ~board.occupied & chess.BB_ALL
+    capturable = board.occupied_co[not turn]
+    if board.ep_square is not None and not chess.BB_SQUARES[board.ep_square] & board.occupied:
+        capturable |= chess.BB_SQUARES[board.ep_square]
+    pawns = board.pawns & own
+
+    # (from square, target squares) for pieces, (None, to - from, target squares) for pawns
+    groups = []
+    total = 0
+    for square in chess.scan_reversed(own & ~pawns):
+        targets = board.attacks_mask(square) & ~own
+        if targets:
+            groups.append((square, 0, targets))
+            total += chess.popcount(targets)
+
+    if turn == chess.WHITE:
+        single = (pawns << 8) & empty
+        pawn_moves = [(8, single), (16, ((single & chess.BB_RANK_3) << 8) & empty),
+                      (7, ((pawns & ~chess.BB_FILE_A) << 7) & capturable),
+                      (9, ((pawns & ~chess.BB_FILE_H) << 9) & capturable)]
+        last_rank = chess.BB_RANK_8
+    else:
+        single = (pawns >> 8) & empty
+        pawn_moves = [(-8, single), (-16, ((single & chess.BB_RANK_6) >> 8) & empty),
+                      (-9, ((pawns & ~chess.BB_FILE_A) >> 9) & capturable),
+                      (-7, ((pawns & ~chess.BB_FILE_H) >> 7) & capturable)]
+        last_rank = chess.BB_RANK_1
+    for shift, targets in pawn_moves:
+        if targets:
+            groups.append((None, shift, targets))
+            # one move for each promotion piece type
+            total += chess.popcount(targets & ~last_rank) + 4 * chess.popcount(targets & last_rank)
+
+    castling = list(board.generate_castling_moves()) if board.castling_rights else []
+    total += len(castling)
+    if total == 0:
+        return None
+
+    index = np.random.randint(total)
+    for from_square, shift, targets in groups:
+        for to_square in chess.scan_forward(targets):
+            if from_square is not None:
+                if index == 0:
+                    return chess.Move(from_square, to_square)
+                index -= 1
+            elif chess.BB_SQUARES[to_square] & last_rank:
+                if index < 4:
+                    return chess.Move(to_square - shift, to_square, _PROMOTIONS[index])
+                index -= 4
+            else:
+                if index == 0:
+                    return chess.Move(to_square - shift, to_square)
+                index -= 1
+    return castling[index]
+
+
+# the per node arrays of MCTS_Tree
+NODE_ARRAYS = ("parent", "moves", "visits", "value_sum", "first_child", "num_children", "keys")
+
+
+class MCTS_Tree():
+    """
+    array backed search tree. a node is an index into preallocated arrays, and
+    the children of a node are stored next to each other: first_child[node] up to
+    first_child[node] + num_children[node]. num_children is -1 until the node's
+    moves have been generated. nodes don't store positions, the board of a node is
+    rebuilt by replaying the moves from the root on a MaterialBoard, which keeps
+    the material score up to date. statistics are shared with other paths to the
+    same position through a transposition table
+    """
+
+    # seconds best_action searches for before committing to a move
+    search_seconds = 8
+    # random playouts run in lockstep from every new leaf, 1 plays a single playout with python-chess instead
+    rollouts_per_leaf = 32
+    rollout_engine = RolloutEngine()
+    # plies a rollout plays before it is scored
+    max_depth_iter = 5
+
+    def __init__(self, state, color, start_time, capacity=1 << 16, table=None):
+        self.root_board = evaluation.MaterialBoard.from_board(state)
+        self.root_board.turn = color
         self.start_time = start_time
-        self.rewards = []
-        
+        # a table passed in is kept across searches, e.g. for the whole game
+        self.table = table if table is not None else TranspositionTable()
+        self.root = 0
+        self.size = 0
+        self._allocate(capacity)
+        self._new_nodes(-1, [0])
+        self.keys[0] = chess.polyglot.zobrist_hash(self.root_board)
+        # move codes the root filter also leaves out, set for one turn (e.g. blunders on most sampled boards)
+        self.excluded_moves = np.zeros(0, dtype=np.uint16)
         return
-    
-    
-    def backprop(self, result):
+
+
+    @property
+    def color(self):
+        return self.root_board.turn
+
+
+    def _allocate(self, capacity):
+        self.parent = np.full(capacity, -1, dtype=np.int32)
+        self.moves = np.zeros(capacity, dtype=np.uint16)
+        self.visits = np.zeros(capacity, dtype=np.int32)
+        # sum of rollout rewards, from the point of view of the player who made the node's move
+        self.value_sum = np.zeros(capacity, dtype=np.float64)
+        self.first_child = np.full(capacity, -1, dtype=np.int32)
+        self.num_children = np.full(capacity, -1, dtype=np.int16)
+        # zobrist hash of the node's position, 0 until the node is first visited
+        self.keys = np.zeros(capacity, dtype=np.uint64)
+
+
+    def _new_nodes(self, parent, move_codes):
+        """
+        adds a block of sibling nodes, growing the arrays if they're full,
+        and returns the index of the first one
+        """
+        first = self.size
+        self.size += len(move_codes)
+        if self.size > len(self.parent):
+            capacity = max(self.size, 2 * len(self.parent))
+            for name in NODE_ARRAYS:
+                old = getattr(self, name)
+                new = np.full(capacity, -1 if name in ["parent", "first_child", "num_children"] else 0, dtype=old.dtype)
+                new[:first] = old[:first]
+                setattr(self, name, new)
+
+        block = slice(first, self.size)
+        self.parent[block] = parent
+        self.moves[block] = move_codes
+        self.visits[block] = 0
+        self.value_sum[block] = 0
+        self.first_child[block] = -1
+        self.num_children[block] = -1
+        self.keys[block] = 0
+        return first
+
+
+    def trim(self):
+        """
+        shrinks the arrays to the nodes in use, e.g. before the tree is sent to
+        another process. they grow again as needed
+        """
+        for name in NODE_ARRAYS:
+            setattr(self, name, getattr(self, name)[:self.size].copy())
+
+
+    def children(self, node):
+        """
+        returns the indices of the children of node, empty if they haven't been generated
+        """
+        return np.arange(self.first_child[node], self.first_child[node] + max(self.num_children[node], 0))
+
+
+    def move(self, node):
+        """
+        returns the move that leads from the parent of node to node
+        """
+        return decode_move(self.moves[node])
+
+
+    def board(self, node):
+        """
+        rebuilds the board of node by replaying its moves from the root
+        """
+        path = []
+        while node != self.root:
+            path.append(self.moves[node])
+            node = self.parent[node]
+        board = self.root_board.copy(stack=False)
+        for code in reversed(path):
+            board.push(decode_move(code))
+        return board
+
+
+    def expand(self, node, board):
+        """
+        adds a child for every move from node, whose board is board
+        """
+        moves = self.get_legal_actions(board)
+        if board.king(chess.WHITE) is None or board.king(chess.BLACK) is None:
+            moves = []
+        self.first_child[node] = self._new_nodes(node, encode_moves(moves))
+        self.num_children[node] = len(moves)
+
+
+    def root_filter(self, codes):
+        """
+        don't move the pawns in front of a king that is still on its starting square,
+        or make an excluded move. takes an array of encoded moves, returns a mask of the allowed moves
+        """
+        allowed = ~np.isin(codes, self.excluded_moves)
+        king_square, pawns = UNCASTLED_KING_PAWNS[self.color]
+        if self.root_board.king(self.color) != king_square:
+            return allowed
+        return allowed & ~moves_from(codes, pawns)
+
+
+    def root_children(self):
+        """
+        returns the children of the root that the root filter allows
+        """
+        if self.num_children[self.root] < 0:
+            self.expand(self.root, self.root_board)
+        children = self.children(self.root)
+        return children[self.root_filter(self.moves[children])]
+
+
+    def reroot(self, node):
+        """
+        makes node the root of the tree, so the search of the next turn starts
+        from what was already searched below it. the rest of the tree is dropped
+        and the nodes that are kept are moved to the front of the arrays
+        """
+        self.root_board = self.board(node)
+        self.excluded_moves = np.zeros(0, dtype=np.uint16)
+        old = (self.parent, self.moves, self.visits, self.value_sum, self.first_child, self.num_children, self.keys)
+        old_parent, old_moves, old_visits, old_value_sum, old_first_child, old_num_children, old_keys = old
+
+        self._allocate(len(old_parent))
+        self.size = 0
+        self.root = self._new_nodes(-1, [0])
+        self.visits[0] = old_visits[node]
+        self.value_sum[0] = old_value_sum[node]
+        self.num_children[0] = old_num_children[node]
+        self.keys[0] = chess.polyglot.zobrist_hash(self.root_board)
+
+        # copy the subtree one block of children at a time
+        pending = [(node, 0)]
+        while pending:
+            old_node, new_node = pending.pop()
+            # python ints: an int16 count would wrap the block offsets past 32767 nodes
+            count = int(old_num_children[old_node])
+            if count <= 0:
+                continue
+            old_first = int(old_first_child[old_node])
+            old_block = slice(old_first, old_first + count)
+            first = int(self._new_nodes(new_node, old_moves[old_block]))
+            new_block = slice(first, first + count)
+            self.visits[new_block] = old_visits[old_block]
+            self.value_sum[new_block] = old_value_sum[old_block]
+            self.num_children[new_block] = old_num_children[old_block]
+            self.keys[new_block] = old_keys[old_block]
+            self.first_child[new_node] = first
+            pending.extend(zip(range(old_block.start, old_block.stop), range(first, first + count)))
+
+
+    def backprop(self, node, result):
         """
         update statistics for all nodes
-        until parent node is reached, for each node, num_visits += 1
-        if result is 1 (win), increment win by 1
-        otherwise if result is loss, increment loss by 1
-        """
-        #print("backprop")
-        self.num_visits += 1
-        self.results[result] += 1
-        if self.parent:
-            self.parent.backprop(result)
-            
-            
+        until the root is reached, for each node, visits += 1
+        result is the reward for the player who moved into node, so it
+        flips sign on the way up as the player to move alternates.
+        the new statistics are stored in the transposition table
+        """
+        path = []
+        while node != -1:
+            self.visits[node] += 1
+            self.value_sum[node] += result
+            result = -result
+            path.append(node)
+            node = self.parent[node]
+
+        for depth, node in enumerate(reversed(path)):
+            self.table.store(int(self.keys[node]), depth, self.visits[node], self.value_sum[node])
+
+
+    def visit(self, node, board):
+        """
+        scores a node that was just reached: the first time a node is visited,
+        statistics that the transposition table has for its position are reused
+        instead of running a rollout
+        """
+        if self.visits[node] == 0:
+            self.keys[node] = chess.polyglot.zobrist_hash(board)
+            stored = self.table.lookup(int(self.keys[node]))
+            if stored is not None and stored[0] > 0:
+                visits, value_sum = stored
+                self.visits[node] = visits
+                self.value_sum[node] = value_sum
+                self.backprop(self.parent[node], -value_sum / visits)
+                return
+
+        reward = self.rollout(board)
+
+        self.backprop(node, reward)
+
+
     def best_action(self):
         """
-        returns node corresponding to best possible move
-        carries out expansion, simulation, and backpropagation
-        """
-        #print("best_action")
-        self.state.turn = self.color
-        #print(self.state)
-        #print(self.color == chess.BLACK)
-        #print(list(self.state.pseudo_legal_moves))
-        A_moves = list(self.state.pseudo_legal_moves).copy()
-        L_moves = []
-        for move in A_moves:
-            if self.color == chess.WHITE and self.baseboard_state.king(chess.WHITE) == chess.E1:
-                if not (chess.parse_square(move.uci()[0:2]) == chess.C2 or chess.parse_square(move.uci()[0:2]) == chess.G2 or chess.parse_square(move.uci()[0:2]) == chess.D2 or chess.parse_square(move.uci()[0:2]) == chess.F2):
-                    L_moves.append(move)
-            elif self.color == chess.BLACK and self.baseboard_state.king(chess.BLACK) == chess.E8:
-                if not (chess.parse_square(move.uci()[0:2]) == chess.C7 or chess.parse_square(move.uci()[0:2]) == chess.G7 or chess.parse_square(move.uci()[0:2]) == chess.D7 or chess.parse_square(move.uci()[0:2]) == chess.F7):
-                    L_moves.append(move)
-            else:
-                L_moves.append(move)
+        returns best possible move from the root
+        carries out selection, expansion, simulation, and backpropagation
+        until the search time runs out
+        """
+        root_children = self.root_children()
+        if len(root_children) == 0:
+            return None
 
-        self.rewards = [[0,0]] * len(L_moves)
+        # every iteration plays its moves on this board and takes them back again
+        scratch = self.root_board.copy(stack=False)
         while True:
-            #v = self.tree_policy()
-            
-            moves = L_moves.copy()
-            if len(moves) == 0:
-                break
-            
-            rand_ind = np.random.randint(len(moves))
-            
-            rand_move = moves.pop(rand_ind)
-            
-            temp_board = chess.Board(self.state.board_fen())
-            
-            temp_board.push(rand_move)
-            
-            new_node = MCTS_Node(temp_board, 0, color = self.color, start_time = self.start_time, parent=self, parent_action=rand_move, width_iter = self.width_iter+1, depth_iter = 1)
-            
-            v = new_node
-            
-            self.children.append(v)
-
-            reward = v.rollout()
-            self.rewards[rand_ind] = [self.rewards[rand_ind][0] + reward, self.rewards[rand_ind][1] + 1]
- 
-            v.backprop(reward)
-            
-            time.perf_counter() - self.start_time
-            
-            if (time.perf_counter() - self.start_time) > 8:
+            self.search_iteration(root_children, scratch)
+
+            if (time.perf_counter() - self.start_time) > self.search_seconds:
                 break
-        return L_moves[np.argmax([i[0]/(i[1]+1) for i in self.rewards])]
-        return self.best_child(c_param=0)
-    
-    
-    def best_child(self, c_param=0.1):
+        return self.move(self.best_child(root_children, c_param=0))
+
+
+    def search_iteration(self, root_children, scratch):
         """
-        once fully expanded, select best child out of children array
-        weighs exploitation (c.q()) and exploration (c.n())
+        one round of selection, expansion, simulation and backpropagation.
+        scratch is a copy of the root board, and is left that way
         """
-        #print("best_child")
-        choices_weights = [(c.q() / c.n()) + c_param * np.sqrt((2 * np.log(self.n()) / c.n())) for c in self.children]
-        return self.children[np.argmax(choices_weights)]
-    
-    
-    def expand(self):
+        node, board = self.tree_policy(root_children, scratch)
+
+        self.visit(node, board)
+
+        while board.move_stack:
+            board.pop()
+
+
+    def ponder(self, stop, max_nodes=1 << 21):
+        """
+        searches from the root until stop (a threading or multiprocessing Event)
+        is set or the tree holds max_nodes nodes. meant for the other player's
+        turn, see _ponder_worker: every move of the root is searched, since the
+        root filter is only for our own moves
+        """
+        if self.num_children[self.root] < 0:
+            self.expand(self.root, self.root_board)
+        root_children = self.children(self.root)
+        if len(root_children) == 0:
+            return
+
+        scratch = self.root_board.copy(stack=False)
+        while not stop.is_set() and self.size < max_nodes:
+            self.search_iteration(root_children, scratch)
+
+
+    def root_statistics(self):
         """
-        next state depends on which action is chosen
-        append all possible child nodes (correspond to generated states) to children array,
-        return child_node
+        returns {move code: [total reward, visits]} for every searched move from the root
         """
-        #print("expand")
+        return {int(self.moves[c]): [self.value_sum[c], self.visits[c]] for c in self.root_children() if self.visits[c] > 0}
 
-        action = self.untried_actions.pop()
-        next_state = self.move(self.state, action)
-        if self.color == chess.WHITE:
-            next_color = chess.BLACK
-        else:
-            next_color = chess.WHITE
 
-        child_node = MCTS_Node(next_state, 0, color = next_color, start_time = self.start_time, parent=self, parent_action=action, width_iter = self.width_iter+1, depth_iter = self.depth_iter)
-        
-        while child_node.is_terminal_node() == False:
-            if not child_node.is_fully_expanded():
-                
-                child_node.expand()
-        #print(self.num_iter)
-        self.children.append(child_node)
-        
-        return child_node
-    
-    def game_result(self, board):
+    def best_child(self, children, c_param=2.0):
         """
-        returns integer corresponding to game result
-        return reward value?
+        select best child out of the visited children
+        weighs exploitation (mean reward) and exploration (visits)
         """
-        #print("game_result")
-        # get all pieces currently on board
-        fen = board.board_fen()
-        
-        num_w_P = fen.count('P')
-        num_w_R = fen.count('R')
-        num_w_N = fen.count('N')
-        num_w_B = fen.count('B')
-        num_w_Q = fen.count('Q')
-        num_w_K = fen.count('K')
-        
-        num_b_p = fen.count('p')
-        num_b_r = fen.count('r')
-        num_b_n = fen.count('n')
-        num_b_b = fen.count('b')
-        num_b_q = fen.count('q')
-        num_b_k = fen.count('k')
-        
-        points_w = num_w_P * 1 + num_w_R * 5 + num_w_N * 3 + num_w_B * 3 + num_w_Q * 8 + num_w_K * 20
-        points_b = num_b_p * 1 + num_b_r * 5 + num_b_n * 3 + num_b_b * 3 + num_b_q * 8 + num_b_k * 20
+        children = children[self.visits[children] > 0]
+        visits = self.visits[children]
+        parent_visits = self.visits[self.parent[children[0]]]
+        choices_weights = self.value_sum[children] / visits + c_param * np.sqrt(2 * np.log(parent_visits) / visits)
+        return children[np.argmax(choices_weights)]
 
-        if self.color == chess.WHITE:
-            reward = points_w - points_b
-        else:
-            reward = points_b - points_w
 
-        return reward
-    
+    def tree_policy(self, root_children, board):
+        """
+        select node to run rollout: walks down by best_child until it reaches a
+        node with unvisited children and returns one of them at random, or a
+        node without moves. board starts at the root and the moves down to the
+        node are pushed on it. returns the node and its board
+        """
+        node = self.root
+        children = root_children
+        while len(children) > 0:
+            unvisited = children[self.visits[children] == 0]
+            if len(unvisited) > 0:
+                node = unvisited[np.random.randint(len(unvisited))]
+                board.push(self.move(node))
+                return node, board
+            node = self.best_child(children)
+            board.push(self.move(node))
+            if self.num_children[node] < 0:
+                self.expand(node, board)
+            children = self.children(node)
+        return node, board
+
 
-    def get_untried_actions(self):
+    def game_result(self, board, color):
         """
-        returns list of untried actions from a given state 
+        returns material difference from the point of view of color
         """
-        #print("get_untried_actions")
-        self.untried_actions = self.get_legal_actions(self.state)
-        return self.untried_actions
+        return evaluation.material(board, color)
     
         
-    
     def get_legal_actions(self, board):
         """
         construct list of all possible actions from current state
         returns a list
         """
-        #print("get_legal_actions")
-
         all_moves = list(board.pseudo_legal_moves)
-
-        '''
-        for move in all_moves:
-            square = chess.parse_square(move.uci()[0:2])
-            print(square)
-            curr_color = self.baseboard_state.piece_at(square).color
-            print(curr_color)
-            
-            if curr_color == self.color:
-                
-                legal_moves.append(move)
-                print(legal_moves)
-        '''       
-            
-        #return legal_moves
         return all_moves
     
     
-    def is_fully_expanded(self):
-        """
-        all actions are popped out of get_untried_actions() one by one
-        when it is empty (size is 0), it is fully expanded
-        """
-        #print("is_fully_expanded")
-        return len(self.untried_actions) == 0
-    
-    
-    def is_game_over(self, board):
+    def is_game_over(self, board, depth):
         """
-        checks if either of the kings have been taken
+        checks if either of the kings have been taken, the side to move is in
+        check, or the rollout is deep enough. running out of moves is left to
+        rollout_policy
         returns True or False
         """
-        #print("is_game_over")
-        
-        self.depth_iter = self.depth_iter + 1
-
-
         if board.king(chess.WHITE) is None or board.king(chess.BLACK) is None:
             return True
 
-        elif len(list(board.pseudo_legal_moves)) == 0:
-            return True
-        
-        elif self.depth_iter > self.max_depth_iter:
+        elif depth > self.max_depth_iter:
             return True
         
         elif board.is_check():
@@ -253,93 +454,168 @@ class MCTS_Node():
         
         return False
     
-    
-    def is_terminal_node(self):
-        """
-        check if current node is terminal or not (terminal node indicates game is over)
-        """
-        #print("is_terminal_node")
-        #print(self.state)
-        return self.is_game_over(self.state)
-    
-    
-    def move(self, board, action):
-        """
-        change state of board with new action taken
-        returns new state
-        """
-        #print("move")
-        # update board with chosen move
-        #self.state.push(action) 
-        board.push(action)
-        
-        #return self.state
-        return board
-    
-    
-    def n(self):
+  
+    def rollout(self, board):
         """
-        return number of visits
+        from board, game is simulated with random moves for a few plies
+        returns material difference for the player who made the last move,
+        averaged over rollouts_per_leaf playouts. board is left as it was:
+        the simulated moves are pushed on it and popped off again
         """
-        #print("n")
-        return self.num_visits    
-    
+        if self.rollouts_per_leaf > 1:
+            scores = self.rollout_engine.rollout(board, self.rollouts_per_leaf, not board.turn)
+            return float(scores.mean())
 
-    def q(self):
-        """
-        returns difference of wins - losses
-        """
-        #print("q")
-        wins = self.results[1]
-        losses = self.results[-1]
-        return wins-losses
-    
-  
-    def rollout(self):
+        color = not board.turn
+        depth = 1
+
+        while not self.is_game_over(board, depth):
+
+            action = self.rollout_policy(board)
+            if action is None:
+                break
+            board.push(action)
+            depth += 1
+
+        reward = self.game_result(board, color)
+        for _ in range(depth - 1):
+            board.pop()
+        return reward
+
+
+    def rollout_policy(self, board):
         """
-        from current state, entire game is simulated until end
-        win -> 1, loss -> -1, draw -> 0
+        randomly selects a pseudo-legal move from board, AKA random playout
+        returns None if there are no moves
         """
-        #print("rollout")
-        current_rollout_state = self.state
-        self.state.turn = not self.color
-        
-        while not self.is_game_over(current_rollout_state):
-      
-            possible_moves = self.get_legal_actions(current_rollout_state)
-            
-            action = self.rollout_policy(possible_moves)
-            current_rollout_state = self.move(current_rollout_state, action)
-            #print(current_rollout_state.turn)
-            #print(current_rollout_state)
-   
-        return self.game_result(current_rollout_state)
-         
-
-
-    def rollout_policy(self, possible_moves):
-        """
-        randomly selects a move out of possible moves, AKA random playout
-        """
-        #print("rollout_policy")
-        #print(possible_moves)
-        #print(len(possible_moves))
-        #print(np.random.randint(len(possible_moves)))
-        return possible_moves[np.random.randint(len(possible_moves))]
-
-    '''
-    def tree_policy(self):
-        """
-        select node to run rollout
-        """
-        #print("tree_policy")
-        current_node = self
-        while not current_node.is_terminal_node():
-            if not current_node.is_fully_expanded():
-                return current_node.expand()
-                #current_node = current_node.expand()
-            else:
-                current_node = current_node.best_child()
-        #print("terminal state reached")
-        return current_node
-    '''
\ No newline at end of file
+        return random_pseudo_legal_move(board)
+
+
+
+def best_merged_action(statistics, allowed=None):
+    """
+    adds up the per-move [total reward, visits] of several searches of the same root
+    (keyed by move code) and returns the move with the best mean reward.
+    only move codes in allowed are considered, if it is given
+    """
+    merged = {}
+    for stats in statistics:
+        for move, (total, visits) in stats.items():
+            if move not in merged:
+                merged[move] = [0, 0]
+            merged[move][0] += total
+            merged[move][1] += visits
+
+    moves = [move for move in merged if merged[move][1] > 0 and (allowed is None or move in allowed)]
+    if len(moves) == 0:
+        return None
+    return decode_move(moves[np.argmax([merged[move][0] / merged[move][1] for move in moves])])
+
+
+def _search_statistics(fen, color, seconds, table=None):
+    """
+    searches a fresh root for seconds and returns its root_statistics
+    """
+    root = MCTS_Tree(state = chess.Board(fen), color = color, start_time = time.perf_counter(), table = table)
+    root.search_seconds = seconds
+    root.best_action()
+    return root.root_statistics()
+
+
+def _search_worker(args):
+    """
+    searches a fresh root in a worker process with its own random stream
+    """
+    fen, color, seconds, seed = args
+    np.random.seed(seed)
+    MCTS_Tree.rollout_engine = RolloutEngine(seed=seed)
+    return _search_statistics(fen, color, seconds)
+
+
+def _ponder_worker(tree, stop, connection, seed):
+    """
+    ponders tree in a child process, so the search doesn't hold the GIL of an
+    opponent playing in our interpreter. once stop is set, only the visits of
+    the opponent's replies are sent back, then the index of one reply is read
+    from connection and just the subtree under it is sent, rerooted and trimmed.
+    None asks for nothing. the transposition table stays behind: copying it
+    would cost more than the entries it gained, and the nodes carry the statistics
+    """
+    np.random.seed(seed)
+    MCTS_Tree.rollout_engine = RolloutEngine(seed=seed)
+    tree.ponder(stop)
+    connection.send(tree.visits[tree.children(tree.root)])
+    reply = connection.recv()
+    if reply is not None:
+        tree.reroot(reply)
+        tree.trim()
+        tree.table = None
+        connection.send(tree)
+    connection.close()
+
+
+class RootParallelSearch():
+    """
+    root parallel MCTS: worker processes search the same root independently while this
+    process searches its own (possibly reused) tree, then the per-move statistics are merged.
+    given determinizations (guesses of the opponent's hidden pieces), each worker searches
+    one of them instead, so the chosen move holds up across the positions we might be in.
+    the pool is made once and reused for every move of the game
+    """
+
+    # seconds the workers stop before this process, so their statistics are in when it's done
+    worker_margin = 0.25
+
+    def __init__(self, processes=None):
+        if processes is None:
+            processes = (os.cpu_count() or 1) - 1
+        self.pool = None
+        # pool workers (e.g. tournament games) are daemons and can't start processes of their own
+        if processes > 0 and not multiprocessing.current_process().daemon:
+            self.pool = multiprocessing.Pool(processes)
+        self.processes = processes if self.pool is not None else 0
+        self.seeds = np.random.SeedSequence()
+
+
+    def best_action(self, root, determinizations=None):
+        """
+        returns the best move from root, searched on every process until root's time runs out.
+        determinizations is an optional list of chess.Board for the workers, used in turn.
+        without a pool they are searched here one after another, root and each of them
+        getting an equal share of the time, so the move still holds up across them
+        """
+        if self.pool is None:
+            if not determinizations:
+                return root.best_action()
+            search_seconds = root.search_seconds
+            seconds = (search_seconds - (time.perf_counter() - root.start_time)) / (len(determinizations) + 1)
+            root.search_seconds = search_seconds - seconds * len(determinizations)
+            root.best_action()
+            root.search_seconds = search_seconds
+            statistics = [root.root_statistics()]
+            statistics += [_search_statistics(board.fen(), root.color, seconds, root.table) for board in determinizations]
+            return best_merged_action(statistics, allowed = set(int(code) for code in root.moves[root.root_children()]))
+
+        seconds = root.search_seconds - (time.perf_counter() - root.start_time)
+        worker_seconds = max(seconds - self.worker_margin, 0)
+        seeds = [int(s.generate_state(1)[0]) for s in self.seeds.spawn(self.processes)]
+        fens = [root.root_board.fen()] if not determinizations else [board.fen() for board in determinizations]
+        pending = self.pool.map_async(_search_worker, [(fens[i % len(fens)], root.color, worker_seconds, seed) for i, seed in enumerate(seeds)])
+
+        root.best_action()
+        statistics = [root.root_statistics()]
+        try:
+            # a second's grace past root's own deadline
+            statistics += pending.get(timeout=max(root.start_time + root.search_seconds - time.perf_counter(), 0) + 1)
+        except multiprocessing.TimeoutError:
+            # workers still searching would hold up the next move's searches, so they go with their pool
+            self.pool.terminate()
+            self.pool = multiprocessing.Pool(self.processes)
+        # a move only some determinizations allow may not exist on the board we actually believe
+        return best_merged_action(statistics, allowed = set(int(code) for code in root.moves[root.root_children()]))
+
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+
+"""
+File Name:      belief.py
+Authors:        Nathan Wang + Celina Huang + Alex Vitale
+Date:           4/2/22
+
+Description:    Belief state of the board as a 12x64 grid of probabilities, one plane per piece type and color, kept up
+                to date with vectorized updates from what the agent learns during the game: its own moves and captures,
+                the opponent's capture reports, sense results, and the opponent's unseen moves.
+"""
+
+import numpy as np
+import chess
+
+
+_SHIFTS = np.arange(64, dtype=np.uint64)
+
+# centers whose 3x3 sense window lies entirely on the board, B2 ... G7 rank by rank
+INTERIOR_CENTERS = np.array([chess.square(file, rank) for rank in range(1, 7) for file in range(1, 7)])
+
+
+def plane(color, piece_type):
+    """
+    :return: int -- the row of the grid for pieces of color and piece_type, in the order of evaluation.piece_bitboards
+    """
+    return (0 if color == chess.WHITE else 6) + piece_type - 1
+
+
+def square_mask(bitboard):
+    """
+    :param bitboard: int
+    :return: (64,) bool array -- True on the squares of the bitboard
+    """
+    return ((np.uint64(bitboard) >> _SHIFTS) & np.uint64(1)) != 0
+
+
+def _targets(color, piece_type, square, captures):
+    """
+    :return: int -- bitboard of the squares a lone piece can move to (captures=False) or capture on (captures=True)
+    """
+    if piece_type == chess.PAWN:
+        if captures:
+            return chess.BB_PAWN_ATTACKS[color][square]
+        forward = 8 if color == chess.WHITE else -8
+        if not 0 <= square + forward < 64:
+            return 0
+        targets = chess.BB_SQUARES[square + forward]
+        if chess.square_rank(square) == (1 if color == chess.WHITE else 6):
+            targets |= chess.BB_SQUARES[square + 2 * forward]
+        return targets
+
+    board = chess.BaseBoard.empty()
+    board.set_piece_at(square, chess.Piece(piece_type, color))
+    targets = board.attacks_mask(square)
+    if piece_type == chess.KING and not captures and square == (chess.E1 if color == chess.WHITE else chess.E8):
+        targets |= chess.BB_SQUARES[square + 2] | chess.BB_SQUARES[square - 2]
+    return targets
+
+
+def _transitions(color, captures):
+    """
+    :return: (6, 64, 64) -- for every piece type and from square, the chance of each to square if that piece moves
+    """
+    table = np.zeros((6, 64, 64))
+    for piece_type in chess.PIECE_TYPES:
+        for square in chess.SQUARES:
+            table[piece_type - 1, square] = square_mask(_targets(color, piece_type, square, captures))
+    totals = table.sum(axis=2, keepdims=True)
+    return np.divide(table, totals, out=np.zeros_like(table), where=totals > 0)
+
+
+# indexed by color
+_MOVES = {color: _transitions(color, False) for color in chess.COLORS}
+_CAPTURES = {color: _transitions(color, True) for color in chess.COLORS}
+
+
+class BeliefState:
+    """
+    grid[plane(color, piece_type), square] is the probability that a piece of that color and type is on square, so a
+    plane adds up to the number of pieces of that kind we expect on the board. Our own planes are exact; the
+    opponent's planes spread out while we can't see their moves and collapse again wherever we sense or capture.
+    Every update ends by caching the most likely square of each plane, so those queries are lookups.
+    """
+
+    def __init__(self, board, color):
+        """
+        :param board: chess.BaseBoard -- the starting position
+        :param color: chess.WHITE or chess.BLACK -- our color
+        """
+        self.color = color
+        self.grid = np.zeros((12, 64))
+        for color_ in chess.COLORS:
+            for piece_type in chess.PIECE_TYPES:
+                self.grid[plane(color_, piece_type)] = square_mask(board.pieces_mask(piece_type, color_))
+
+        # views of our planes and the opponent's
+        self.ours = self.grid[plane(color, chess.PAWN):plane(color, chess.KING) + 1]
+        self.theirs = self.grid[plane(not color, chess.PAWN):plane(not color, chess.KING) + 1]
+        # number of opponent pieces of each type we expect on the board
+        self.expected = self.theirs.sum(axis=1)
+        self._refresh()
+
+    def _refresh(self):
+        self.likely_squares = self.grid.argmax(axis=1)
+        self.likely_probabilities = self.grid[np.arange(12), self.likely_squares]
+
+    def _normalize(self, fixed):
+        """
+        Scales every opponent plane outside the fixed squares so the plane adds up to its expected count again.
+
+        :param fixed: (64,) bool array -- squares whose probabilities are known and left alone
+        """
+        free = np.where(fixed, 0.0, self.theirs)
+        target = np.maximum(self.expected - np.where(fixed, self.theirs, 0.0).sum(axis=1), 0)
+        total = free.sum(axis=1)
+        scale = np.divide(target, total, out=np.zeros_like(total), where=total > 0)
+        self.theirs[:] = np.where(fixed, self.theirs, np.minimum(free * scale[:, None], 1.0))
+        self.expected = self.theirs.sum(axis=1)
+        self._refresh()
+
+    def our_squares(self):
+        """
+        :return: (64,) bool array -- the squares holding our pieces
+        """
+        return self.ours.sum(axis=0) > 0
+
+    def our_move(self, move, captured_square=None):
+        """
+        Moves our piece and clears the opponent from the squares the move passed through.
+
+        :param move: chess.Move -- the move that was actually made
+        :param captured_square: chess.Square -- where we captured a piece, None if we didn't
+        """
+        piece = int(self.ours[:, move.from_square].argmax())
+        self.ours[:, move.from_square] = 0
+        self.ours[(move.promotion - 1) if move.promotion else piece, move.to_square] = 1
+        if piece == chess.KING - 1 and chess.square_distance(move.from_square, move.to_square) == 2:
+            rook_from, rook_to = ((move.to_square + 1, move.to_square - 1) if move.to_square > move.from_square
+                                  else (move.to_square - 2, move.to_square + 1))
+            self.ours[chess.ROOK - 1, rook_from] = 0
+            self.ours[chess.ROOK - 1, rook_to] = 1
+
+        fixed = square_mask(chess.between(move.from_square, move.to_square) | chess.BB_SQUARES[move.to_square])
+        if captured_square is not None:
+            # we don't know what we captured: each type loses its share of the probability on that square
+            captured = self.theirs[:, captured_square]
+            share = captured / captured.sum() if captured.sum() > 0 else self.expected / max(self.expected.sum(), 1)
+            self.expected = np.maximum(self.expected - share, 0)
+            fixed[captured_square] = True
+        self.theirs[:, fixed] = 0
+        self._normalize(fixed)
+
+    def opponent_moved(self, captured_square=None):
+        """
+        Spreads the opponent's planes over the squares their pieces could have moved to. Only one piece moves, so each
+        keeps most of its probability where it was.
+
+        :param captured_square: chess.Square -- where the opponent captured our piece, None if they didn't
+        """
+        transitions = _MOVES if captured_square is None else _CAPTURES
+        move_chance = 1 / max(self.expected.sum(), 1)
+        fixed = np.zeros(64, dtype=bool)
+
+        if captured_square is None:
+            arrived = np.einsum("ts,tsd->td", self.theirs, transitions[not self.color])
+            self.theirs[:] = (1 - move_chance) * self.theirs + move_chance * arrived
+            # moving onto our pieces would have been a capture
+            self.theirs[:, self.our_squares()] = 0
+        else:
+            self.ours[:, captured_square] = 0
+            # the capturer is one of the pieces that attack the square, weighted by how likely each is there
+            origins = self.theirs * transitions[not self.color][:, :, captured_square]
+            likelihood = origins.sum(axis=1)
+            if likelihood.sum() == 0:
+                likelihood = self.expected.copy()
+            capturer = likelihood / max(likelihood.sum(), 1e-12)
+            origin_totals = origins.sum(axis=1, keepdims=True)
+            leaving = np.divide(origins, origin_totals, out=np.zeros_like(origins), where=origin_totals > 0)
+            self.theirs[:] = np.maximum(self.theirs - capturer[:, None] * leaving, 0)
+            self.theirs[:, captured_square] = capturer
+            fixed[captured_square] = True
+        self._normalize(fixed)
+
+    def sense(self, sense_result):
+        """
+        Sets the opponent's planes to what was seen on the sensed squares.
+
+        :param sense_result: List((chess.Square, chess.Piece)) -- as passed to handle_sense_result
+        """
+        fixed = np.zeros(64, dtype=bool)
+        observed = [(square, piece.piece_type - 1) for square, piece in sense_result
+                    if piece is not None and piece.color != self.color]
+        fixed[[square for square, _ in sense_result]] = True
+        self.theirs[:, fixed] = 0
+        if observed:
+            squares, planes = zip(*observed)
+            self.theirs[list(planes), list(squares)] = 1
+        self.expected = np.maximum(self.expected, self.theirs[:, fixed].sum(axis=1))
+        self._normalize(fixed)
+
+    def most_likely_square(self, piece_type, color=None):
+        """
+        :param color: defaults to the opponent's color
+        :return: chess.Square -- where a piece of that type is most likely to be
+        """
+        return int(self.likely_squares[plane(not self.color if color is None else color, piece_type)])
+
+    def confidence(self, piece_type, color=None):
+        """
+        :param color: defaults to the opponent's color
+        :return: float -- the probability of the piece being on its most likely square
+        """
+        return float(self.likely_probabilities[plane(not self.color if color is None else color, piece_type)])
+
+    def probability(self, square, piece_type, color=None):
+        """
+        :param color: defaults to the opponent's color
+        :return: float -- the probability of a piece of that type and color being on square
+        """
+        return float(self.grid[plane(not self.color if color is None else color, piece_type), square])
+
+    def square_entropy(self):
+        """
+        :return: (64,) -- the entropy in bits of what is on each square: empty, or one of the opponent's piece types
+        """
+        outcomes = np.vstack([self.theirs, np.maximum(1 - self.theirs.sum(axis=0), 0)])
+        outcomes /= np.maximum(outcomes.sum(axis=0), 1e-12)
+        logs = np.log2(outcomes, out=np.zeros_like(outcomes), where=outcomes > 0)
+        return -(outcomes * logs).sum(axis=0)
+
+    def sense_scores(self):
+        """
+        A sense reveals its whole window, so the information it is expected to give is the entropy of those squares:
+        a 3x3 box sum over the entropy of the board, taken at every interior center at once.
+
+        :return: (36,) -- the expected information in bits of sensing around each of INTERIOR_CENTERS
+        """
+        entropy = self.square_entropy().reshape(8, 8)
+        scores = np.zeros((6, 6))
+        for rank in range(3):
+            for file in range(3):
+                scores += entropy[rank:rank + 6, file:file + 6]
+        return scores.ravel()
+
+    def best_sense(self):
+        """
+        :return: (chess.Square, float) -- the interior center expected to give the most information, and how much
+        """
+        scores = self.sense_scores()
+        best = int(np.argmax(scores))
+        return int(INTERIOR_CENTERS[best]), float(scores[best])
+
+    def opponent_occupancy(self):
+        """
+        :return: (64,) -- the probability of each square holding an opponent piece
+        """
+        return np.minimum(self.theirs.sum(axis=0), 1.0)
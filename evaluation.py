@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+"""
+File Name:      evaluation.py
+Authors:        Nathan Wang + Celina Huang + Alex Vitale
+Date:           4/2/22
+
+Description:    Material evaluation shared by the search and the agent: piece values, a board that keeps its material
+                balance up to date as moves are pushed and popped, and batch scoring of positions from piece bitboards.
+"""
+
+import numpy as np
+import chess
+
+
+# material values by piece type, indexed by chess.PAWN ... chess.KING
+PIECE_VALUES = np.array([0, 1, 3, 3, 5, 8, 20], dtype=np.int32)
+
+# weights of the 12 piece bitboards of piece_bitboards: WHITE pawns ... kings, then BLACK pawns ... kings
+_BITBOARD_WEIGHTS = np.concatenate([PIECE_VALUES[1:], -PIECE_VALUES[1:]])
+
+
+def piece_value(piece):
+    """
+    :param piece: chess.Piece
+    :return: int -- the material value of the piece
+    """
+    return int(PIECE_VALUES[piece.piece_type])
+
+
+def material(board, color):
+    """
+    :param board: chess.BaseBoard
+    :param color: the color to score for
+    :return: int -- the material difference from the point of view of color
+    """
+    if isinstance(board, MaterialBoard):
+        return board.material(color)
+    return _count_material(board, color)
+
+
+def _count_material(board, color):
+    balance = 0
+    for piece_type in chess.PIECE_TYPES:
+        pieces = board.pieces_mask(piece_type, chess.WHITE), board.pieces_mask(piece_type, chess.BLACK)
+        balance += int(PIECE_VALUES[piece_type]) * (chess.popcount(pieces[0]) - chess.popcount(pieces[1]))
+    return balance if color == chess.WHITE else -balance
+
+
+def piece_bitboards(boards):
+    """
+    :param boards: List(chess.BaseBoard)
+    :return: (N, 12) uint64 -- the WHITE pawn ... king and BLACK pawn ... king bitboards of every board
+    """
+    return np.array([[board.pieces_mask(piece_type, color) for color in (chess.WHITE, chess.BLACK)
+                      for piece_type in chess.PIECE_TYPES] for board in boards], dtype=np.uint64).reshape(-1, 12)
+
+
+def _popcount(bitboards):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(bitboards)
+    bits = np.unpackbits(np.ascontiguousarray(bitboards).view(np.uint8), axis=-1)
+    return bits.reshape(bitboards.shape + (64,)).sum(axis=-1)
+
+
+def batch_material(bitboards, color):
+    """
+    Scores many positions at once with one dot product of piece counts and values.
+
+    :param bitboards: (N, 12) uint64 -- piece bitboards as returned by piece_bitboards
+    :param color: the color to score for
+    :return: (N,) -- the material difference of every position from the point of view of color
+    """
+    balance = _popcount(bitboards).astype(np.int32) @ _BITBOARD_WEIGHTS
+    return balance if color == chess.WHITE else -balance
+
+
+class MaterialBoard(chess.Board):
+    """
+    chess.Board that updates its material balance (WHITE minus BLACK) on every push and pop, so scoring a position
+    costs nothing. Only push and pop are tracked: after changing the board any other way, call reset_material.
+    """
+
+    def __init__(self, fen=chess.STARTING_FEN, *, chess960=False):
+        super().__init__(fen, chess960=chess960)
+        self._material_stack = []
+        self.reset_material()
+
+    @classmethod
+    def from_board(cls, board):
+        """
+        :param board: chess.Board
+        :return: MaterialBoard -- the same position, without the move stack
+        """
+        return cls(board.fen(), chess960=board.chess960)
+
+    def reset_material(self):
+        """
+        Recounts the material balance from the piece bitboards.
+        """
+        self.balance = _count_material(self, chess.WHITE)
+
+    def material(self, color):
+        """
+        :return: int -- the material difference from the point of view of color
+        """
+        return self.balance if color == chess.WHITE else -self.balance
+
+    def push(self, move):
+        gain = 0
+        if move:
+            captured = self.piece_type_at(move.to_square)
+            if captured is not None:
+                gain += PIECE_VALUES[captured]
+            elif self.is_en_passant(move):
+                gain += PIECE_VALUES[chess.PAWN]
+            if move.promotion:
+                gain += PIECE_VALUES[move.promotion] - PIECE_VALUES[chess.PAWN]
+
+        self._material_stack.append(self.balance)
+        self.balance += int(gain) if self.turn == chess.WHITE else -int(gain)
+        super().push(move)
+
+    def pop(self):
+        move = super().pop()
+        self.balance = self._material_stack.pop()
+        return move
+
+    def copy(self, *, stack=True):
+        board = super().copy(stack=stack)
+        board.balance = self.balance
+        if stack:
+            stack = len(self.move_stack) if stack is True else stack
+            board._material_stack = self._material_stack[-stack:] if stack else []
+        else:
+            board._material_stack = []
+        return board
@@ -10,7 +10,75 @@ Source:         Adapted from recon-chess (https://pypi.org/project/reconchess/)
 """
 
 import chess
-from datetime import datetime
+from collections import namedtuple
+from collections.abc import Sequence
+from game_clock import GameClock
+
+
+# everything that happened in one turn, enough to replay the game through Game
+TurnEvent = namedtuple("TurnEvent", ["sense", "requested_move", "taken_move", "captured_square", "timed_out"])
+
+
+def _sense_window(square):
+    """
+    :param square: chess.SQUARE -- the center of the sense
+    :return: List(chess.SQUARE) -- the squares of the 3x3 window around `square` that are on the board, top rank first
+    """
+    rank, file = chess.square_rank(square), chess.square_file(square)
+    window = []
+    for delta_rank in [1, 0, -1]:
+        for delta_file in [-1, 0, 1]:
+            if 0 <= rank + delta_rank <= 7 and 0 <= file + delta_file <= 7:
+                window.append(chess.square(file + delta_file, rank + delta_rank))
+    return window
+
+
+# precomputed 3x3 sense windows, indexed by center square
+SENSE_SQUARES = [tuple(_sense_window(square)) for square in chess.SQUARES]
+SENSE_MASKS = [sum(chess.BB_SQUARES[s] for s in window) for window in SENSE_SQUARES]
+
+
+class SenseResult(Sequence):
+    """
+    The true state of a 3x3 sense window, snapshotted from the truth board as bitboards. It reads like the list of
+    (square, piece) tuples that agents expect, but that list is only built the first time it is accessed.
+    """
+
+    def __init__(self, square, board):
+        self.square = square
+        self.mask = SENSE_MASKS[square]
+        self.occupied = board.occupied & self.mask
+        self.white = board.occupied_co[chess.WHITE] & self.mask
+        self.piece_masks = (board.pawns & self.mask, board.knights & self.mask, board.bishops & self.mask,
+                            board.rooks & self.mask, board.queens & self.mask, board.kings & self.mask)
+        self._result = None
+
+    def _piece_at(self, square):
+        bb_square = chess.BB_SQUARES[square]
+        if not self.occupied & bb_square:
+            return None
+        for piece_type, piece_mask in zip(chess.PIECE_TYPES, self.piece_masks):
+            if piece_mask & bb_square:
+                return chess.Piece(piece_type, bool(self.white & bb_square))
+
+    def _as_list(self):
+        if self._result is None:
+            self._result = [(square, self._piece_at(square)) for square in SENSE_SQUARES[self.square]]
+        return self._result
+
+    def __getitem__(self, index):
+        return self._as_list()[index]
+
+    def __len__(self):
+        return len(SENSE_SQUARES[self.square])
+
+    def __eq__(self, other):
+        if isinstance(other, Sequence):
+            return self._as_list() == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return repr(self._as_list())
 
 
 class Game:
@@ -19,47 +87,106 @@ class Game:
         self.turn = chess.WHITE  # True for white, False for black
 
         self.truth_board = chess.Board()
-        self.white_board = chess.Board()
-        self.black_board = chess.Board()
-
-        white_fen = "8/8/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
-        black_fen = "rnbqkbnr/pppppppp/8/8/8/8/8/8 w KQkq - 0 1"
 
-        self.white_board.set_fen(white_fen)
-        self.black_board.set_fen(black_fen)
+        # each color sees its own pieces plus whatever it sensed since the last move. the views are kept as
+        # bitboards of sensed squares and only turned into chess.Board objects when white_board/black_board is read
+        self._sensed_squares = {chess.WHITE: chess.BB_EMPTY, chess.BLACK: chess.BB_EMPTY}
+        self._views = {chess.WHITE: None, chess.BLACK: None}
 
         self.is_finished = False
 
-        self.seconds_left_by_color = {chess.WHITE: seconds_left, chess.BLACK: seconds_left}
-        self.current_turn_start_time = None
+        self.clock = GameClock(seconds_left)
         self.took_to_long_to_move = False
 
         self.move_result = None
 
+        # one TurnEvent per handled move, and the sense of the turn in progress
+        self.history = []
+        self._sense = None
+
+        # per-turn cache of get_moves() and the legality index built from it
+        self._moves = None
+        self._move_index = None
+        self._truth_move_index = None
+        self._moves_key = None
+
     def start(self):
         """
         Starts off the clock for the first player.
         """
-        self.current_turn_start_time = datetime.now()
+        self.clock.start(self.turn)
 
     def end(self):
         """
         Ends the game.
         """
-        self.seconds_left_by_color[self.turn] = self.get_seconds_left()
+        self.clock.stop()
         self.is_finished = True
 
+    @property
+    def seconds_left_by_color(self):
+        """
+        :return: dict -- The amount of seconds left for each color, read from the game clock.
+        """
+        return {color: self.clock.seconds_left(color) for color in chess.COLORS}
+
     def get_seconds_left(self):
         """
         :return: float -- The amount of seconds left for the current player.
         """
-        if not self.is_finished and self.current_turn_start_time:
-            elapsed_since_turn_start = (datetime.now() - self.current_turn_start_time).total_seconds()
-            return self.seconds_left_by_color[self.turn] - elapsed_since_turn_start
-        else:
-            return self.seconds_left_by_color[self.turn]
+        return self.clock.seconds_left(self.turn)
+
+    ###=== Per-color board views ===###
+    @property
+    def white_board(self):
+        """
+        :return: chess.Board -- WHITE's view of the game: its own pieces and the squares it sensed this turn
+        """
+        return self._view_of(chess.WHITE)
+
+    @property
+    def black_board(self):
+        """
+        :return: chess.Board -- BLACK's view of the game: its own pieces and the squares it sensed this turn
+        """
+        return self._view_of(chess.BLACK)
+
+    def _view_of(self, color):
+        """
+        Materializes the view of `color` from the truth board. The board is cached until either the truth board or
+        the visible squares change.
+        :param color: chess.WHITE or chess.BLACK -- the color whose view is wanted
+
+        :return: chess.Board
+        """
+        visible = self.truth_board.occupied_co[color] | self._sensed_squares[color]
+        key = (self.truth_board.ply(), visible)
+
+        if self._views[color] is None or self._views[color][0] != key:
+            self._views[color] = (key, self._masked_board(self.truth_board, visible))
+        return self._views[color][1]
+
+    def _masked_board(self, board, mask):
+        """
+        Returns a copy of the board with every piece outside of `mask` removed.
+        :param board: chess.Board -- the board to copy pieces from
+        :param mask: chess.Bitboard -- the squares to keep
+
+        :return: a chess.Board object
+        """
+        b = board.copy(stack=False)
+        b.pawns &= mask
+        b.knights &= mask
+        b.bishops &= mask
+        b.rooks &= mask
+        b.queens &= mask
+        b.kings &= mask
+        b.occupied_co[chess.WHITE] &= mask
+        b.occupied_co[chess.BLACK] &= mask
+        b.occupied &= mask
+        b.promoted = chess.BB_EMPTY
+        return b
 
-    ###=== Generate Legal Moves ===###
     def _without_opponent_pieces(self, board, turn):
         """
         Returns a copy of the board with the opponent's pieces removed.
@@ -68,44 +195,119 @@ class Game:
 
         :return: a chess.Board object
         """
-        b = board.copy()
-        for piece_type in chess.PIECE_TYPES:
-            for sq in b.pieces(piece_type, not turn):
-                b.remove_piece_at(sq)
-        return b
+        return self._masked_board(board, board.occupied_co[turn])
+
+    ###=== Generate Legal Moves ===###
 
     def _moves_without_opponent_pieces(self, board, turn):
         """
-        Returns list of legal moves without regard to opponent piece locations.
-        :param board: chess.Board -- a chess board where you want opponnet's pieces to be removed
+        Returns list of legal moves without regard to opponent piece locations. The opponent's pieces are masked out
+        of the occupancy bitboard instead of being removed from a copy of the board.
+        :param board: chess.Board -- a chess board where you want opponnet's pieces to be ignored
         :param turn: bool - True(WHITE's turn) or False(BLACK's turn), the opponnet is the 'not turn'
 
         :return: List(chess.Move)
         """
-        return list(self._without_opponent_pieces(board, turn).generate_pseudo_legal_moves())
+        moves = []
+        our_pieces = board.occupied_co[turn]
+        pawns = board.pawns & our_pieces
+
+        # piece moves, with sliders only blocked by our own pieces
+        for from_square in chess.scan_reversed(our_pieces & ~board.pawns):
+            bb_square = chess.BB_SQUARES[from_square]
+            if bb_square & board.knights:
+                attacks = chess.BB_KNIGHT_ATTACKS[from_square]
+            elif bb_square & board.kings:
+                attacks = chess.BB_KING_ATTACKS[from_square]
+            else:
+                attacks = 0
+                if bb_square & (board.bishops | board.queens):
+                    attacks = chess.BB_DIAG_ATTACKS[from_square][chess.BB_DIAG_MASKS[from_square] & our_pieces]
+                if bb_square & (board.rooks | board.queens):
+                    attacks |= (chess.BB_RANK_ATTACKS[from_square][chess.BB_RANK_MASKS[from_square] & our_pieces] |
+                                chess.BB_FILE_ATTACKS[from_square][chess.BB_FILE_MASKS[from_square] & our_pieces])
+            for to_square in chess.scan_reversed(attacks & ~our_pieces):
+                moves.append(chess.Move(from_square, to_square))
+
+        moves.extend(self._castling_moves_without_opponent_pieces(board, turn))
+
+        # pawn advances, only blocked by our own pieces
+        if turn == chess.WHITE:
+            single_moves = pawns << 8 & ~our_pieces & chess.BB_ALL
+            double_moves = single_moves << 8 & ~our_pieces & chess.BB_RANK_4
+        else:
+            single_moves = pawns >> 8 & ~our_pieces
+            double_moves = single_moves >> 8 & ~our_pieces & chess.BB_RANK_5
+
+        for to_square in chess.scan_reversed(single_moves):
+            from_square = to_square + (8 if turn == chess.BLACK else -8)
+            if chess.BB_SQUARES[to_square] & chess.BB_BACKRANKS:
+                for piece_type in [chess.QUEEN, chess.ROOK, chess.BISHOP, chess.KNIGHT]:
+                    moves.append(chess.Move(from_square, to_square, piece_type))
+            else:
+                moves.append(chess.Move(from_square, to_square))
+
+        for to_square in chess.scan_reversed(double_moves):
+            from_square = to_square + (16 if turn == chess.BLACK else -16)
+            moves.append(chess.Move(from_square, to_square))
+
+        # en passant captures
+        if board.ep_square is not None and not chess.BB_SQUARES[board.ep_square] & our_pieces:
+            capturers = pawns & chess.BB_PAWN_ATTACKS[not turn][board.ep_square] & chess.BB_RANKS[4 if turn else 3]
+            for from_square in chess.scan_reversed(capturers):
+                moves.append(chess.Move(from_square, board.ep_square))
+
+        return moves
+
+    def _castling_moves_without_opponent_pieces(self, board, turn):
+        """
+        Generates castling moves when only our own pieces can block the king and rook. The opponent's pieces are
+        invisible, so they can neither block nor attack the king's path.
+        :param board: chess.Board -- a chess board where you want opponnet's pieces to be ignored
+        :param turn: bool - True(WHITE's turn) or False(BLACK's turn), the opponnet is the 'not turn'
+
+        :return: List(chess.Move)
+        """
+        our_pieces = board.occupied_co[turn]
+        backrank = chess.BB_RANK_1 if turn == chess.WHITE else chess.BB_RANK_8
+        king = our_pieces & board.kings & ~board.promoted & backrank
+        king &= -king
+        if not king:
+            return []
+
+        king_square = chess.msb(king)
+        castling_moves = []
+        for rook_square in chess.scan_reversed(board.clean_castling_rights() & backrank):
+            rook = chess.BB_SQUARES[rook_square]
+            a_side = rook < king
+            king_to = chess.square(2 if a_side else 6, chess.square_rank(king_square))
+            rook_to = chess.square(3 if a_side else 5, chess.square_rank(king_square))
+
+            path = (chess.between(king_square, king_to) | chess.between(rook_square, rook_to) |
+                    chess.BB_SQUARES[king_to] | chess.BB_SQUARES[rook_to])
+            if not (our_pieces ^ king ^ rook) & path:
+                castling_moves.append(chess.Move(king_square, king_to))
+        return castling_moves
 
     def _pawn_capture_moves_on(self, board, turn):
         """
         Generates all pawn captures on `board`, even if there is no piece to capture. All promotion moves are included.
-        :param board: chess.Board -- a chess board where you want opponnet's pieces to be removed
+        :param board: chess.Board -- a chess board where you want opponnet's pieces to be ignored
         :param turn: bool - True(WHITE's turn) or False(BLACK's turn), the opponnet is the 'not turn'
 
         :return: List(chess.Move)
         """
         pawn_capture_moves = []
 
-        no_opponents_board = self._without_opponent_pieces(board, turn)
-
-        for pawn_square in board.pieces(chess.PAWN, turn):
-            for attacked_square in board.attacks(pawn_square):
-                # skip this square if one of our own pieces are on the square
-                if no_opponents_board.piece_at(attacked_square):
-                    continue
+        our_pieces = board.occupied_co[turn]
 
+        for pawn_square in chess.scan_forward(board.pawns & our_pieces):
+            # skip the squares where one of our own pieces are
+            for attacked_square in chess.scan_forward(chess.BB_PAWN_ATTACKS[turn][pawn_square] & ~our_pieces):
                 pawn_capture_moves.append(chess.Move(pawn_square, attacked_square))
 
                 # add in promotion moves
-                if attacked_square in chess.SquareSet(chess.BB_BACKRANKS):
+                if chess.BB_SQUARES[attacked_square] & chess.BB_BACKRANKS:
                     for piece_type in chess.PIECE_TYPES[1:-1]:
                         pawn_capture_moves.append(chess.Move(pawn_square, attacked_square, promotion=piece_type))
 
@@ -114,13 +316,49 @@ class Game:
     def get_moves(self):
         """
         Returns list of legal moves without regard to opponent piece locations. Allows for pawns to move diagonally.
+        The list is generated once per turn and cached until a move is pushed or the turn passes without one.
         :return: List(chess.Move)
         """
         if self.is_finished:
             return None
 
-        return self._moves_without_opponent_pieces(self.truth_board,self.turn) + \
-                self._pawn_capture_moves_on(self.truth_board, self.turn)
+        self._update_ply_cache()
+
+        # hand out a copy so an agent mutating its list can't corrupt the cache
+        return list(self._moves)
+
+    def _update_ply_cache(self):
+        """
+        Regenerates the move list and drops the legality indexes when the truth board has moved on to a new ply or
+        the turn has changed without a move, as it does after a timeout.
+        """
+        key = (self.truth_board.ply(), self.turn)
+        if self._moves_key == key:
+            return
+
+        self._moves = self._moves_without_opponent_pieces(self.truth_board, self.turn) + \
+                      self._pawn_capture_moves_on(self.truth_board, self.turn)
+        self._move_index = None
+        self._truth_move_index = None
+        self._moves_key = key
+
+    def _requestable_moves(self):
+        """
+        :return: Set(chess.Move) -- the moves from get_moves() hashed for constant time legality checks
+        """
+        self._update_ply_cache()
+        if self._move_index is None:
+            self._move_index = set(self._moves)
+        return self._move_index
+
+    def _truth_pseudo_legal_moves(self):
+        """
+        :return: Set(chess.Move) -- the pseudo legal moves on the truth board, shared by move revision and sliding
+        """
+        self._update_ply_cache()
+        if self._truth_move_index is None:
+            self._truth_move_index = set(self.truth_board.generate_pseudo_legal_moves())
+        return self._truth_move_index
 
     ###=== Make move and update board ===###
     def _capture_square_of_move(self, board, move):
@@ -166,8 +404,9 @@ class Game:
         # its legal
         return False
 
-    def _slide_move(self, board, move):
-        psuedo_legal_moves = list(board.generate_pseudo_legal_moves())
+    def _slide_move(self, board, move, psuedo_legal_moves=None):
+        if psuedo_legal_moves is None:
+            psuedo_legal_moves = set(board.generate_pseudo_legal_moves())
         squares = list(chess.SquareSet(chess.between(move.from_square,move.to_square))) + [move.to_square]
         squares = sorted(squares, key=lambda s: chess.square_distance(s, move.from_square), reverse=True)
         for slide_square in squares:
@@ -177,16 +416,17 @@ class Game:
         return None
 
     def _add_pawn_queen_promotion(self, move):
-        back_ranks = list(chess.SquareSet(chess.BB_BACKRANKS))
-        piece = self.truth_board.piece_at(move.from_square)
-        if piece is not None and piece.piece_type == chess.PAWN and move.to_square in back_ranks and move.promotion is None:
+        is_pawn = self.truth_board.pawns & chess.BB_SQUARES[move.from_square]
+        to_back_rank = chess.BB_SQUARES[move.to_square] & chess.BB_BACKRANKS
+        if is_pawn and to_back_rank and move.promotion is None:
             move = chess.Move(move.from_square, move.to_square, chess.QUEEN)
         return move
 
     def _revise_move(self, move):
         # if its a legal move, don't change it at all. note that board.generate_psuedo_legal_moves() does not
         # include psuedo legal castles
-        if move in self.truth_board.generate_pseudo_legal_moves() or self._is_psuedo_legal_castle(self.truth_board, move):
+        psuedo_legal_moves = self._truth_pseudo_legal_moves()
+        if move in psuedo_legal_moves or self._is_psuedo_legal_castle(self.truth_board, move):
             return move
 
         # note: if there are pieces in the way, we DONT capture them
@@ -196,9 +436,9 @@ class Game:
         # if the piece is a sliding piece, slide it as far as it can go
         piece = self.truth_board.piece_at(move.from_square)
         if piece.piece_type in [chess.PAWN, chess.ROOK, chess.BISHOP, chess.QUEEN]:
-            move = self._slide_move(self.truth_board, move)
+            move = self._slide_move(self.truth_board, move, psuedo_legal_moves)
 
-        return move if move in self.truth_board.generate_pseudo_legal_moves() else None
+        return move if move in psuedo_legal_moves else None
 
     def handle_move(self, requested_move):
         """
@@ -215,13 +455,15 @@ class Game:
             return requested_move, None, None, ""
 
         if self.took_to_long_to_move:
+            self.history.append(TurnEvent(self._sense, requested_move, None, None, True))
+            self._sense = None
             return None, None, None, ""
 
         if requested_move is None:
             taken_move = None   #pass move
             captured_square = None #doesn't capture anything
             reason = "Ran out of time or None object passed in"
-        elif requested_move not in self.get_moves():  #checks legality of move
+        elif requested_move not in self._requestable_moves():  #checks legality of move
             taken_move = None   #pass move
             captured_square = None #doesn't capture anything
             reason = "{} is an illegal move made.".format(requested_move)
@@ -236,16 +478,16 @@ class Game:
         #if self.turn == chess.WHITE: self.white_board.push(taken_move if taken_move is not None else chess.Move.null())
         #else: self.black_board.push(taken_move if taken_move is not None else chess.Move.null())
 
-        if self.turn == chess.WHITE:
-            self.white_board.set_fen(self._without_opponent_pieces(self.truth_board, self.turn).fen())
-            self.black_board.set_fen(self._without_opponent_pieces(self.truth_board, not self.turn).fen())
-        else:
-            self.black_board.set_fen(self._without_opponent_pieces(self.truth_board, self.turn).fen())
-            self.white_board.set_fen(self._without_opponent_pieces(self.truth_board, not self.turn).fen())
+        # both views fall back to only their own pieces, which follow the truth board
+        self._sensed_squares[chess.WHITE] = chess.BB_EMPTY
+        self._sensed_squares[chess.BLACK] = chess.BB_EMPTY
 
         # store captured_square to notify other player
         self.move_result = captured_square
 
+        self.history.append(TurnEvent(self._sense, requested_move, taken_move, captured_square, False))
+        self._sense = None
+
         return requested_move, taken_move, captured_square, reason
 
     ###=== Handle sense square ===###
@@ -254,29 +496,17 @@ class Game:
         This function takes the sense square and returns the true state of the 3x3 section
 
         :param square: chess.SQUARES -- the square the agent wants to senese around
-        :return: A list of tuples, where each tuple contains a :class:`Square` in the sense, and if there
-                 was a piece on the square, then the corresponding :class:`chess.Piece`, otherwise `None`.
+        :return: SenseResult -- a sequence of tuples, where each tuple contains a :class:`Square` in the sense, and if
+                 there was a piece on the square, then the corresponding :class:`chess.Piece`, otherwise `None`.
         """
-        if square not in list(chess.SQUARES):
+        self._sense = square
+        if square not in range(64):
             return []
 
-        rank, file = chess.square_rank(square), chess.square_file(square)
-        sense_result = []
-        for delta_rank in [1, 0, -1]:
-            for delta_file in [-1, 0, 1]:
-                if 0 <= rank + delta_rank <= 7 and 0 <= file + delta_file <= 7:
-                    sense_square = chess.square(file + delta_file, rank + delta_rank)
-                    sense_result.append((sense_square, self.truth_board.piece_at(sense_square)))
-
         #update sense result for each respective color board
-        if self.turn == chess.WHITE:
-            for square, piece in sense_result:
-                self.white_board.set_piece_at(square, piece)
-        else:
-            for square, piece in sense_result:
-                self.black_board.set_piece_at(square, piece)
+        self._sensed_squares[self.turn] |= SENSE_MASKS[square]
 
-        return sense_result
+        return SenseResult(square, self.truth_board)
 
     ###=== Return captured square ===###
     def opponent_move_result(self):
@@ -296,11 +526,8 @@ class Game:
             . Starts the timer for the next player
         """
 
-        elapsed = datetime.now() - self.current_turn_start_time
-        self.seconds_left_by_color[self.turn] -= elapsed.total_seconds()
-
         self.turn = not self.turn
-        self.current_turn_start_time = datetime.now()
+        self.clock.start(self.turn)
 
     def is_over(self):
         """
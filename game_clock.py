@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+"""
+File Name:      game_clock.py
+Authors:        Nathan Wang + Celina Huang + Alex Vitale
+Date:           4/2/22
+
+Description:    Monotonic game clock that keeps track of each player's time, broken down by phase of the turn.
+"""
+
+import time
+from contextlib import contextmanager
+
+import chess
+
+
+OPPONENT_RESULT = "opponent_result"
+SENSE = "sense"
+MOVE = "move"
+ENGINE = "engine"
+
+PHASES = (OPPONENT_RESULT, SENSE, MOVE, ENGINE)
+# the phases spent inside the player's own callbacks
+PLAYER_PHASES = (OPPONENT_RESULT, SENSE, MOVE)
+
+NS_PER_SECOND = 1000000000
+
+
+class GameClock:
+    """
+    Chess clock built on time.perf_counter_ns. Only one color runs at a time, and while it runs its time is charged
+    to the current phase. Time that isn't spent inside a player callback is charged to ENGINE.
+    """
+
+    def __init__(self, seconds_left=600):
+        budget_ns = int(seconds_left * NS_PER_SECOND)
+        self.budget_ns = {chess.WHITE: budget_ns, chess.BLACK: budget_ns}
+        self.used_ns = {color: {phase: 0 for phase in PHASES} for color in chess.COLORS}
+
+        self.color = None
+        self.phase = ENGINE
+        self.turn_ns = {phase: 0 for phase in PHASES}
+        self._segment_start = None
+
+    def _charge(self):
+        """
+        Charges the time since the last charge to the running color and phase.
+        """
+        now = time.perf_counter_ns()
+        if self._segment_start is not None:
+            elapsed = now - self._segment_start
+            self.used_ns[self.color][self.phase] += elapsed
+            self.turn_ns[self.phase] += elapsed
+        self._segment_start = now
+
+    def is_running(self):
+        """
+        :return: bool -- True if a color's clock is currently running
+        """
+        return self._segment_start is not None
+
+    def start(self, color):
+        """
+        Starts the clock of `color` on a new turn. Any other running clock is stopped first.
+        :param color: chess.WHITE or chess.BLACK -- the color to move
+        """
+        self.stop()
+        self.color = color
+        self.phase = ENGINE
+        self.turn_ns = {phase: 0 for phase in PHASES}
+        self._segment_start = time.perf_counter_ns()
+
+    def stop(self):
+        """
+        Stops the running clock, charging it for the time used so far.
+        """
+        if self._segment_start is not None:
+            self._charge()
+            self._segment_start = None
+
+    def resume(self):
+        """
+        Restarts the clock of the color that was last running, without starting a new turn.
+        """
+        if self._segment_start is None and self.color is not None:
+            self._segment_start = time.perf_counter_ns()
+
+    def set_phase(self, phase):
+        """
+        Charges the time used so far to the current phase and switches to `phase`.
+        :param phase: str -- one of PHASES
+        """
+        if self._segment_start is not None:
+            self._charge()
+        self.phase = phase
+
+    @contextmanager
+    def charging(self, phase):
+        """
+        Charges the time spent inside the with block to `phase`, then returns to the previous phase.
+        :param phase: str -- one of PHASES
+        """
+        previous = self.phase
+        self.set_phase(phase)
+        try:
+            yield
+        finally:
+            self.set_phase(previous)
+
+    @contextmanager
+    def paused(self):
+        """
+        Stops the clock for the duration of the with block, so the framework's own work isn't charged to anyone.
+        """
+        was_running = self.is_running()
+        self.stop()
+        try:
+            yield
+        finally:
+            if was_running:
+                self.resume()
+
+    def _used_ns(self, color):
+        used = sum(self.used_ns[color].values())
+        if color == self.color and self._segment_start is not None:
+            used += time.perf_counter_ns() - self._segment_start
+        return used
+
+    def seconds_left(self, color):
+        """
+        :param color: chess.WHITE or chess.BLACK
+        :return: float -- the seconds left on the clock of `color`, including the turn that is in progress
+        """
+        return (self.budget_ns[color] - self._used_ns(color)) / NS_PER_SECOND
+
+    def turn_seconds(self, phases=PHASES):
+        """
+        :param phases: the phases to count, e.g. PLAYER_PHASES to leave out the framework's own time
+        :return: float -- the seconds charged to the running color for `phases` since its turn started
+        """
+        turn_ns = sum(self.turn_ns[phase] for phase in phases)
+        if self._segment_start is not None and self.phase in phases:
+            turn_ns += time.perf_counter_ns() - self._segment_start
+        return turn_ns / NS_PER_SECOND
+
+    def phase_seconds(self, color):
+        """
+        :param color: chess.WHITE or chess.BLACK
+        :return: dict -- the seconds charged to `color` for each phase, not including the segment in progress
+        """
+        return {phase: used / NS_PER_SECOND for phase, used in self.used_ns[color].items()}
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+
+"""
+File Name:      game_record.py
+Authors:        Nathan Wang + Celina Huang + Alex Vitale
+Date:           4/2/22
+
+Description:    Compact binary game records. A game is stored as its starting position and the bit-packed sequence of
+                senses, requested/taken moves and capture squares; any position is rebuilt by replaying the events
+                through Game. Records are appended to an archive file with a separate offset index for random access.
+"""
+
+import os
+import struct
+from collections import namedtuple
+
+import chess
+from game import Game, TurnEvent
+from move_encoding import encode_move, decode_move
+
+
+GameRecord = namedtuple("GameRecord", ["starting_fen", "winner_color", "winner_reason", "turns"])
+
+ARCHIVE_MAGIC = b"RBMC"
+ARCHIVE_VERSION = 1
+
+_NO_SENSE = 64
+_WINNERS = {chess.BLACK: 0, chess.WHITE: 1, None: 2}
+_WINNER_COLORS = {code: color for color, code in _WINNERS.items()}
+
+_HEADER = struct.Struct("<4sB")
+_OFFSET = struct.Struct("<Q")
+_LENGTH = struct.Struct("<I")
+
+
+class _BitWriter:
+    def __init__(self):
+        self.value = 0
+        self.length = 0
+
+    def write(self, value, bits):
+        self.value |= value << self.length
+        self.length += bits
+
+    def to_bytes(self):
+        return self.value.to_bytes((self.length + 7) // 8, "little")
+
+
+class _BitReader:
+    def __init__(self, data):
+        self.value = int.from_bytes(data, "little")
+
+    def read(self, bits):
+        result = self.value & ((1 << bits) - 1)
+        self.value >>= bits
+        return result
+
+
+def _write_move(bits, move):
+    """
+    Writes a presence bit, then from square (6 bits), to square (6 bits) and promotion piece type (3 bits).
+    """
+    if move is None:
+        bits.write(0, 1)
+    else:
+        bits.write(1, 1)
+        bits.write(encode_move(move), 15)
+
+
+def _read_move(bits):
+    if not bits.read(1):
+        return None
+    return decode_move(bits.read(15))
+
+
+def _write_square(bits, square):
+    if square is None:
+        bits.write(0, 1)
+    else:
+        bits.write(1, 1)
+        bits.write(square, 6)
+
+
+def _read_square(bits):
+    return bits.read(6) if bits.read(1) else None
+
+
+def record_of(game, winner_color, winner_reason, starting_fen=chess.STARTING_FEN):
+    """
+    :param game: Game -- a finished game
+    :return: GameRecord -- the record of `game`
+    """
+    return GameRecord(starting_fen, winner_color, winner_reason, list(game.history))
+
+
+def encode_game(record):
+    """
+    Packs a game record into bytes. A turn whose requested move was taken as is takes 26 bits, plus 6 for a capture.
+
+    :param record: GameRecord
+    :return: bytes
+    """
+    fen = b"" if record.starting_fen == chess.STARTING_FEN else record.starting_fen.encode("ascii")
+    reason = (record.winner_reason or "").encode("utf-8")
+
+    bits = _BitWriter()
+    for turn in record.turns:
+        bits.write(turn.sense if turn.sense in range(64) else _NO_SENSE, 7)
+        bits.write(turn.timed_out, 1)
+        _write_move(bits, turn.requested_move)
+        if turn.taken_move == turn.requested_move and turn.requested_move is not None:
+            bits.write(1, 1)
+        else:
+            bits.write(0, 1)
+            _write_move(bits, turn.taken_move)
+        _write_square(bits, turn.captured_square)
+
+    return b"".join([
+        struct.pack("<B", len(fen)), fen,
+        struct.pack("<BB", _WINNERS[record.winner_color], len(reason)), reason,
+        struct.pack("<I", len(record.turns)),
+        bits.to_bytes(),
+    ])
+
+
+def decode_game(data):
+    """
+    :param data: bytes -- a game packed by encode_game
+    :return: GameRecord
+    """
+    fen_length = data[0]
+    starting_fen = data[1:1 + fen_length].decode("ascii") or chess.STARTING_FEN
+    pos = 1 + fen_length
+    winner, reason_length = data[pos], data[pos + 1]
+    winner_reason = data[pos + 2:pos + 2 + reason_length].decode("utf-8") or None
+    pos += 2 + reason_length
+    num_turns, = struct.unpack_from("<I", data, pos)
+
+    bits = _BitReader(data[pos + 4:])
+    turns = []
+    for _ in range(num_turns):
+        sense = bits.read(7)
+        timed_out = bool(bits.read(1))
+        requested_move = _read_move(bits)
+        taken_move = requested_move if bits.read(1) else _read_move(bits)
+        captured_square = _read_square(bits)
+        turns.append(TurnEvent(None if sense == _NO_SENSE else sense, requested_move, taken_move, captured_square,
+                               timed_out))
+
+    return GameRecord(starting_fen, _WINNER_COLORS[winner], winner_reason, turns)
+
+
+def replay(record, num_turns=None):
+    """
+    Rebuilds a game by playing its recorded events through Game.
+
+    :param record: GameRecord
+    :param num_turns: int -- the number of turns to replay, defaults to the whole game
+    :return: Game -- the game after `num_turns` turns
+    """
+    game = Game()
+    if record.starting_fen != chess.STARTING_FEN:
+        game.truth_board.set_fen(record.starting_fen)
+        game.turn = game.truth_board.turn
+    game.start()
+
+    for turn in record.turns[:num_turns]:
+        if turn.sense is not None:
+            game.handle_sense(turn.sense)
+        game.took_to_long_to_move = turn.timed_out
+        game.handle_move(turn.requested_move)
+        game.took_to_long_to_move = False
+        game.end_turn()
+    return game
+
+
+class GameArchive:
+    """
+    An append-only file of encoded games, with an index file of 64-bit offsets (`<path>.idx`) so any game can be
+    read without scanning the ones before it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + ".idx"
+
+        if not os.path.exists(self.path):
+            with open(self.path, "wb") as f:
+                f.write(_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_VERSION))
+            open(self.index_path, "wb").close()
+
+        with open(self.path, "rb") as f:
+            magic, version = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != ARCHIVE_MAGIC or version != ARCHIVE_VERSION:
+            raise RuntimeError("{} is not a version {} game archive".format(self.path, ARCHIVE_VERSION))
+
+    def __len__(self):
+        return os.path.getsize(self.index_path) // _OFFSET.size
+
+    def append(self, record):
+        """
+        :param record: GameRecord or bytes from encode_game
+        :return: int -- the index of the appended game
+        """
+        data = record if isinstance(record, bytes) else encode_game(record)
+        with open(self.path, "ab") as f:
+            offset = f.tell()
+            f.write(_LENGTH.pack(len(data)))
+            f.write(data)
+        with open(self.index_path, "ab") as f:
+            f.write(_OFFSET.pack(offset))
+        return len(self) - 1
+
+    def read(self, index):
+        """
+        :param index: int -- the index of the game
+        :return: GameRecord
+        """
+        if not 0 <= index < len(self):
+            raise IndexError("game {} is not in {}".format(index, self.path))
+        with open(self.index_path, "rb") as f:
+            f.seek(index * _OFFSET.size)
+            offset, = _OFFSET.unpack(f.read(_OFFSET.size))
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            length, = _LENGTH.unpack(f.read(_LENGTH.size))
+            return decode_game(f.read(length))
+
+    def __getitem__(self, index):
+        return self.read(index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.read(index)
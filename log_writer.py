@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+"""
+File Name:      log_writer.py
+Authors:        Nathan Wang + Celina Huang + Alex Vitale
+Date:           4/2/22
+
+Description:    Background thread that does the game's log and console I/O off of the players' clocks.
+"""
+
+import queue
+import threading
+
+
+class BackgroundWriter:
+    """
+    Runs submitted write calls in order on a background thread. The queue is bounded, so a slow disk makes submit()
+    block instead of letting the backlog grow without limit. With synchronous=True every call runs immediately on
+    the caller's thread instead.
+    """
+
+    _CLOSE = object()
+
+    def __init__(self, max_pending=1024, synchronous=False):
+        self.synchronous = synchronous
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._thread = None
+        if not synchronous:
+            self._thread = threading.Thread(target=self._run, name="BackgroundWriter", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is self._CLOSE:
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+                continue
+            func, args = item
+            if self._error is not None:
+                continue
+            try:
+                func(*args)
+            except Exception as e:
+                # keep draining so submit() never blocks forever, and report the error from close()
+                self._error = e
+
+    def submit(self, func, *args):
+        """
+        Queues `func(*args)` to be run on the writer thread. Arguments must not change after they are submitted,
+        so pass strings (e.g. a board's FEN) rather than boards.
+        """
+        if self.synchronous:
+            func(*args)
+        else:
+            self._queue.put((func, args))
+
+    def write(self, out, text):
+        """
+        Queues `text` to be written to the file `out`.
+        """
+        self.submit(out.write, text)
+
+    def print(self, text):
+        """
+        Queues `text` to be printed to the console.
+        """
+        self.submit(print, text)
+
+    def flush(self):
+        """
+        Waits for everything submitted so far to be written, and leaves the writer thread running.
+        """
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        """
+        Waits for everything that was submitted to be written, then stops the writer thread.
+        """
+        if self._thread is None:
+            return
+        self._queue.put(self._CLOSE)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+"""
+File Name:      move_encoding.py
+Authors:        Nathan Wang + Celina Huang + Alex Vitale
+Date:           4/2/22
+
+Description:    16-bit integer moves shared by the agent, the search and the game records: bits 0-5 hold the from
+                square, bits 6-11 the to square and bits 12-14 the promotion piece type (0 for none). Arrays of them
+                are filtered with square bitmasks.
+"""
+
+import numpy as np
+import chess
+
+
+MOVE_DTYPE = np.uint16
+
+
+def encode_move(move):
+    """
+    :param move: chess.Move
+    :return: int -- the move packed into 15 bits
+    """
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+
+def decode_move(code):
+    """
+    :param code: int -- a move packed by encode_move
+    :return: chess.Move
+    """
+    code = int(code)
+    return chess.Move(code & 63, code >> 6 & 63, (code >> 12) or None)
+
+
+def encode_moves(moves):
+    """
+    :param moves: List(chess.Move)
+    :return: uint16 array of the packed moves
+    """
+    return np.fromiter((encode_move(move) for move in moves), dtype=MOVE_DTYPE, count=len(moves))
+
+
+def from_squares(codes):
+    return codes & 63
+
+
+def to_squares(codes):
+    return (codes >> 6) & 63
+
+
+def promotions(codes):
+    return codes >> 12
+
+
+def moves_from(codes, squares_mask):
+    """
+    :param codes: uint16 array of packed moves
+    :param squares_mask: int -- a bitboard of squares
+    :return: bool array -- True for the moves that start on one of the squares
+    """
+    return (np.left_shift(np.uint64(1), from_squares(codes).astype(np.uint64)) & np.uint64(squares_mask)) != 0
+
+
+def moves_to(codes, squares_mask):
+    """
+    :param codes: uint16 array of packed moves
+    :param squares_mask: int -- a bitboard of squares
+    :return: bool array -- True for the moves that end on one of the squares
+    """
+    return (np.left_shift(np.uint64(1), to_squares(codes).astype(np.uint64)) & np.uint64(squares_mask)) != 0
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+"""
+File Name:      move_evaluation.py
+Authors:        Nathan Wang + Celina Huang + Alex Vitale
+Date:           4/2/22
+
+Description:    Scores every candidate move against every sampled opponent board in one batched pass, so the agent
+                can prefer moves that hold up whatever the opponent's hidden pieces turn out to be.
+"""
+
+import numpy as np
+import chess
+
+from evaluation import PIECE_VALUES, batch_material
+from move_encoding import from_squares, to_squares, promotions
+from rollout_engine import bitboards_to_array, is_attacked
+
+
+def evaluate_moves(bitboards, codes, color, weights=None):
+    """
+    Values a move on a board by the material it wins, the king's value if it captures the opponent's king, and minus
+    the king's value if it leaves our king where an opponent piece attacks it. Moves are played as given: a slider
+    isn't stopped short by a piece in its way, and castling doesn't move the rook.
+
+    :param bitboards: (K, 12) uint64 -- sampled boards as returned by evaluation.piece_bitboards, all with the same
+                      pieces of color
+    :param codes: (M,) uint16 -- the candidate moves of color, from move_encoding.encode_moves
+    :param color: the color to move
+    :param weights: (K,) -- the weight of each board, equal if None
+
+    :return: ((M,), (M,)) -- the expected value of each move over the boards, and its variance
+    """
+    if len(codes) == 0:
+        return np.zeros(0), np.zeros(0)
+    ours = slice(0, 6) if color == chess.WHITE else slice(6, 12)
+    theirs = slice(6, 12) if color == chess.WHITE else slice(0, 6)
+    one = np.uint64(1)
+    from_bits = one << from_squares(codes).astype(np.uint64)
+    to_bits = one << to_squares(codes).astype(np.uint64)
+
+    # (M, K, 6): which opponent piece each move captures on each board
+    captured = (bitboards[None, :, theirs] & to_bits[:, None, None]) != 0
+    promoted = promotions(codes).astype(np.intp)
+
+    # our pieces are the same on every board, so the moving piece is found on the first
+    movers = ((bitboards[0, ours][None, :] & from_bits[:, None]) != 0).argmax(axis=1)
+    after = np.repeat(bitboards[None], len(codes), axis=0)
+    after[:, :, theirs] &= ~to_bits[:, None, None]
+    rows = np.arange(len(codes))
+    our_planes = np.arange(12)[ours]
+    after[rows, :, our_planes[movers]] &= ~from_bits[:, None]
+    after[rows, :, our_planes[np.where(promoted > 0, promoted - 1, movers)]] |= to_bits[:, None]
+    # material won by the capture and the promotion
+    gain = (batch_material(after.reshape(-1, 12), color).reshape(len(codes), len(bitboards)) -
+            batch_material(bitboards, color)[None, :]).astype(np.float64)
+
+    array = bitboards_to_array(after.reshape(-1, 12))
+    sign = 1 if color == chess.WHITE else -1
+    kings = array[:, :64] == sign * chess.KING
+    king_squares = np.where(kings.any(axis=1), kings.argmax(axis=1), 64)
+    in_danger = is_attacked(array, -sign, king_squares).reshape(len(codes), len(bitboards))
+
+    king_value = float(PIECE_VALUES[chess.KING])
+    values = np.where(captured[..., chess.KING - 1], king_value, np.where(in_danger, -king_value, gain))
+    mean = np.average(values, axis=1, weights=weights)
+    variance = np.average(np.square(values - mean[:, None]), axis=1, weights=weights)
+    return mean, variance
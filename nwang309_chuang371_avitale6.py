@@ -16,10 +16,34 @@ from player import Player
 import numpy as np
 #from MCTS import *
 import MCTS
+import multiprocessing
 import time
+from transposition_table import TranspositionTable
+from time_manager import TimeManager
+import evaluation
+from belief import BeliefState
+from particle_filter import ParticleFilter
+from tactics import TacticalMaps
+from move_evaluation import evaluate_moves
+from move_encoding import encode_move, encode_moves, from_squares, moves_to
 
 #MCTS_Node = MCTS.MCTS_Node()
 
+# below this probability on its most likely square, the opponent's king is considered lost
+KING_LOST_CONFIDENCE = 0.5
+
+# bits of expected information below which no sense is better than another
+MIN_SENSE_INFORMATION = 1e-6
+
+# boards sampled from the particle filter to check candidate moves on
+EVALUATION_SAMPLES = 64
+# a move is left out of the search if its expected value minus RISK_AVERSION standard deviations is more than
+# BLUNDER_MARGIN below the best move's
+RISK_AVERSION = 0.5
+BLUNDER_MARGIN = 3
+# boards sampled from the particle filter for the search when there are no worker processes to give one each
+SEARCH_DETERMINIZATIONS = 3
+
 
 # TODO: Rename this class to what you would like your bot to be named during the game.
 class TheRookies(Player):
@@ -37,6 +61,22 @@ class TheRookies(Player):
         self.root = None
         self.curr = None
         
+        # MCTS tree from the last search, kept to be reused next turn
+        self.search_tree = None
+        self.last_sense = []
+        self.search_pool = None
+        self.transpositions = None
+        self.time_manager = TimeManager()
+        # whether our last move captured a piece
+        self.made_capture = False
+        
+        # background search of the opponent's replies while it is their turn
+        self.ponder_process = None
+        self.ponder_connection = None
+        self.ponder_stop = None
+        # our copy of the tree the child process is pondering
+        self.pondered_tree = None
+        
         self.num_moves = 0
         
         self.opponent_castled = False
@@ -55,24 +95,10 @@ class TheRookies(Player):
         
         
         
-        # Holds array of [piece location, whether it's moved]
-        self.opponent_king_loc = None
-        self.opponent_knights = None
-        self.opponent_bishops = None
-        self.opponent_queens = None
-        self.opponent_rooks = None
-        self.opponent_pawns = None
-        
-        self.chess_dict = None
-        
-        self.piece_reward = {
-            "q" : 8,
-            "n" : 3,
-            "r" : 5,
-            "p" : 1,
-            "b" : 3,
-            "k" : 20
-        }
+        # probabilities of where every piece is
+        self.belief = None
+        # sampled guesses of the opponent's hidden pieces, for the search
+        self.particles = None
         
         #self.keys = ["k", "q", "n", "r", "p", "b"]
         
@@ -94,6 +120,11 @@ class TheRookies(Player):
         self.board = board.copy()
         self.color = color
         
+        # worker processes for root parallel MCTS, reused for the whole game
+        self.search_pool = MCTS.RootParallelSearch()
+        # statistics of searched positions, shared by every search of the game
+        self.transpositions = TranspositionTable()
+        
         # initialize reward_table with values at game start
         '''
         if self.color == chess.WHITE:
@@ -132,53 +163,22 @@ class TheRookies(Player):
         self.curr = self.root
         '''
         
-        # Set king location
+        self.belief = BeliefState(board, self.color)
+        self.particles = ParticleFilter(board, self.color)
+        
         if self.color == chess.WHITE:
-            self.opponent_king_loc = [[chess.E8, False]]
-            self.opponent_pawns = [[chess.square(x, 6), False] for x in range(8)]
-            self.opponent_queens = [[chess.D8, False]]
-            self.opponent_bishops = [[chess.C8, False], [chess.F8, False]]
-            self.opponent_rooks = [[chess.A8, False], [chess.H8, False]]
-            self.opponent_knights = [[chess.B8, False], [chess.G8, False]]
-            
             self.pawns = [chess.square(x, 1) for x in range(8)]
 
         else:
-            self.opponent_king_loc = [[chess.E1, False]]
-            self.opponent_pawns = [[chess.square(x, 1), False] for x in range(8)]
-            self.opponent_queens = [[chess.D1, False]]
-            self.opponent_bishops = [[chess.C1, False], [chess.F1, False]]
-            self.opponent_rooks = [[chess.A1, False], [chess.H1, False]]
-            self.opponent_knights = [[chess.B1, False], [chess.G1, False]]
-            
-            
             self.pawns = [chess.square(x, 6) for x in range(8)]
         
-        self.chess_dict = {
-            "k" : self.opponent_king_loc,
-            "q" : self.opponent_queens,
-            "n" : self.opponent_knights,
-            "r" : self.opponent_rooks,
-            "p" : self.opponent_pawns,
-            "b" : self.opponent_bishops
-        }
-        
         pass
     
-    def find_piece(self, location):
-        
-    
-        for key in self.chess_dict:
-            if self.chess_dict[key] is not None:
-                
-                for piece in self.chess_dict[key]:
-                    
-                    # if not limbo mode and locations match
-                    if not piece[1] and piece[0] == location:
-                        # found it
-                        return (key, piece)
-        
-        return (None, None)
+    def opponent_king(self):
+        """
+        :return: (chess.Square, bool) -- where the opponent's king most likely is, and whether we have lost track of it
+        """
+        return self.belief.most_likely_square(chess.KING), self.belief.confidence(chess.KING) < KING_LOST_CONFIDENCE
         
         
     def handle_opponent_move_result(self, captured_piece, captured_square):
@@ -187,14 +187,22 @@ class TheRookies(Player):
         :param captured_piece: bool - true if your opponents captured your piece with their last move
         :param captured_square: chess.Square - position where your piece was captured
         """
+        # started first, so the turn's budget accounts for stopping the ponder search too
+        self.time_manager.start_turn()
+        self.stop_pondering()
         piece = None
         
+        # as WHITE, the first turn comes before the opponent has moved
+        if self.color == chess.BLACK or self.num_moves > 0:
+            self.belief.opponent_moved(captured_square if captured_piece else None)
+            self.particles.opponent_moved(captured_square if captured_piece else None)
+        
         if captured_piece:
             #self.board.remove_piece_at(captured_square)
             
             
             #################### 
-            piece = self.game_board.piece_at(captured_square).symbol().lower()
+            piece = self.game_board.piece_at(captured_square)
                 
             
             self.game_board.remove_piece_at(captured_square)
@@ -207,7 +215,7 @@ class TheRookies(Player):
         self.captured = captured_square
         
         if piece is not None:
-            return self.piece_reward[piece]
+            return evaluation.piece_value(piece)
         return None
         
         #pass
@@ -223,80 +231,37 @@ class TheRookies(Player):
         """
         # TODO: update this method
         
-        # for first 1 or 2 (?) turns, sense king location
-        if self.num_moves <= 1:
-            if self.color == chess.WHITE:
-                return chess.E7     
-            return chess.E2
+        # sense where it is expected to tell us the most about the opponent's pieces
+        sense, information = self.belief.best_sense()
+        if information > MIN_SENSE_INFORMATION:
+            return sense
         
-        #print(chess.square_name(self.chess_dict["k"][0][0]))
-        # Sense around last captured piece
-        if self.captured is not None:
+        # nothing on the board is uncertain (our first turn as WHITE): sense around the king
+        king_square, king_lost = self.opponent_king()
+        file = chess.square_file(king_square)
+        rank = chess.square_rank(king_square)
         
-            #location = chess.parse_square(chess.square_name(self.captured))
-            file = chess.square_file(self.captured)
-            rank = chess.square_rank(self.captured)
-            
+        # Fully utilize all 9 squares for sense
+        if file == 0:
+            file = 1
+        elif file == 7:
+            file = 6
             
-            # Fully utilize all 9 squares for sense
-            if file == 0:
-                file = 1
-            elif file == 7:
-                file = 6
-                
-            if rank == 0:
-                rank = 1
-            elif rank == 7:
-                rank = 6
-                
-            return chess.square(file, rank)
+        if rank == 0:
+            rank = 1
+        elif rank == 7:
+            rank = 6
         
-        # IMPLEMENT Q LEARNING? reward = points from pieces sensed
-        
-        #rewards_new = np.copy(self.reward_table)
-        
-        #king_dist = chess.square_distance()
-        
-        #print(1 - np.exp(-1 * self.num_moves))
-        #print(1 - np.power(1.5, -1 * self.num_moves))
-        if np.random.random() > (1 - np.power(1.5, -1 * self.num_moves)) or self.chess_dict["k"][0][1]:
-            #print("randomly selecting")
-            possible_loc = []
-            for i in range(1,7):
-                for j in range (1,7):
-                    curr_square = chess.square(j, i)
-                    king_dist = chess.square_distance(curr_square, self.chess_dict["k"][0][0])
-                    for x in range(6-king_dist):
-                       possible_loc.append(curr_square) 
-            #print (possible_loc)
-            return possible_loc[np.random.randint(len(possible_loc))]
-        
-        else:
-            #print("sense king")
-            file = chess.square_file(self.chess_dict["k"][0][0])
-            rank = chess.square_rank(self.chess_dict["k"][0][0])
-            
-            # Fully utilize all 9 squares for sense
-            if file == 0:
-                file = 1
-            elif file == 7:
-                file = 6
-                
-            if rank == 0:
-                rank = 1
-            elif rank == 7:
-                rank = 6
-            
-            return chess.square(file, rank)
+        return chess.square(file, rank)
         
         
         '''
         # If no castling occured, keep eye on king
-        #print(self.chess_dict["k"])
-        if not self.chess_dict["k"][0][1]:
+        #print(king_square)
+        if not king_lost:
             
-            file = chess.square_file(self.chess_dict["k"][0][0])
-            rank = chess.square_rank(self.chess_dict["k"][0][0])
+            file = chess.square_file(king_square)
+            rank = chess.square_rank(king_square)
             
             # Fully utilize all 9 squares for sense
             if file == 0:
@@ -331,8 +296,8 @@ class TheRookies(Player):
             # Check king location every other time
             if self.num_moves % 2 == 0 or len(self.pawns) == 0:
                 
-                file = chess.square_file(self.chess_dict["k"][0][0])
-                rank = chess.square_rank(self.chess_dict["k"][0][0])
+                file = chess.square_file(king_square)
+                rank = chess.square_rank(king_square)
                 
                 # Fully utilize all 9 squares for sense
                 if file == 0:
@@ -349,7 +314,7 @@ class TheRookies(Player):
                 
             else:
                 
-                distances = [chess.square_distance(self.chess_dict["k"][0][0], x) for x in self.pawns]
+                distances = [chess.square_distance(king_square, x) for x in self.pawns]
                 
                 closest_pawn = self.pawns[np.argmin(distances)]
                 
@@ -410,70 +375,34 @@ class TheRookies(Player):
         new_reward = 0
         
         sensed_square = sense_result[5][0]
+        self.last_sense = list(sense_result)
+        self.belief.sense(self.last_sense)
+        self.particles.sense(self.last_sense)
         
         # iterate over every square in sense_result
-        for location, piece in sense_result:          
+        moved_here = []
+        for location, piece in self.last_sense:          
             
+            previous = self.game_board.piece_at(location)
             #self.board.set_piece_at(location, piece)
             self.game_board.set_piece_at(location, piece)
-            
-            #self.chess_dict["k"] = location
-            
-            # result[0] is piece type (key), result[1] is a specific piece
-            result = self.find_piece(location)
-
-            # we think there's a piece there
-            # result[0] is the key ('p', 'q', etc.)
-            # result[1] is the piece, result[1][0] is the location, result[1][1] is the limbo mode toggle
-            if result[0] is not None and (piece is None or result[0] != piece.symbol().lower()):
-                #print("we think there is a piece here and either sensed nothing or it didn't match what used to be there")
-                result[1][1] = True
-                # update board by removing piece at square where nothing was sensed
-                if piece is None:
-                    self.game_board.remove_piece_at(location)
-                
                 
             # if there's a piece there, and it is not our piece 
             if piece is not None and piece.color != self.color:
                 #print("it is a piece, but not our piece")
-                
-                piece_symbol = piece.symbol().lower()
-                
-                new_reward = new_reward + self.piece_reward[piece_symbol]
-                
-                # if the piece matches what we think is there, then okay
-                if result[0] is not None and piece_symbol == result[0]:
-                    #print("there was a piece there, and it matches what is currently there")
-                    continue
-                # if piece doesn't match what is there
-                else:
-                    #print("new piece doesn't match")
-                    
-                    # look through dictionary to check all pieces of that type, and add the ones that are in limbo to list
-                    limbo = []
-                    #print(type(piece_type))
-                    for chess_piece in self.chess_dict[piece_symbol]:
-                    
-                        if chess_piece[1] == True:
-                            
-                            limbo.append(chess_piece)
-                    
-                    # if nothing is in limbo, add all of them
-                    if len(limbo) == 0:
-                        
-                        limbo = self.chess_dict[piece_symbol]
-                    
-    
-                    distance = [chess.square_distance(location, x[0]) for x in limbo]
-                    
-                    self.game_board.remove_piece_at(limbo[np.argmin(distance)][0])
-                    
-             
-                    limbo[np.argmin(distance)][0] = location
-                    limbo[np.argmin(distance)][1] = False
-    
-                    # add guess piece back into board
-                    self.game_board.set_piece_at(location, piece)
+                new_reward = new_reward + evaluation.piece_value(piece)
+                
+                # a piece we didn't expect here came from somewhere else on our board
+                if previous != piece:
+                    moved_here.append(piece)
+        
+        sensed = chess.SquareSet(location for location, _ in self.last_sense)
+        for piece in moved_here:
+            # take it off the square where the belief now thinks it least likely to be
+            elsewhere = self.game_board.pieces(piece.piece_type, piece.color) - sensed
+            if elsewhere:
+                stale = min(elsewhere, key=lambda square: self.belief.probability(square, piece.piece_type))
+                self.game_board.remove_piece_at(stale)
                     
                     
         # update reward_table with new reward value at sensed square
@@ -521,6 +450,10 @@ class TheRookies(Player):
         dumb_board.turn = self.color
         possible_moves = list(dumb_board.pseudo_legal_moves)
         
+        # only a turn that runs MCTS leaves a tree behind for the next turn
+        previous_tree = self.search_tree
+        self.search_tree = None
+        
         if self.num_moves == 0:
             if self.color == chess.WHITE:
                 return chess.Move(chess.E2, chess.E3)
@@ -534,35 +467,27 @@ class TheRookies(Player):
             else:
                 return chess.Move(chess.F7, chess.F6)
         '''
-        for move in possible_moves:
-            if chess.parse_square(move.uci()[2:4]) == self.chess_dict["k"][0][0]:
-                return move
-        
-        if dumb_board.is_check():
-            king_move = None
-            for move in possible_moves:
-                dumb_board = chess.Board(self.game_board.board_fen())
-                dumb_board.turn = self.color
-                squares = dumb_board.checkers()
-                dumber_board = dumb_board.copy()
-                dumber_board.turn = self.color
-                dumber_board.push(move)
-                if chess.parse_square(move.uci()[0:2]) == self.game_board.king(self.color) and not dumber_board.is_check():
-                    king_move = move
-                if len(squares) > 1 and chess.parse_square(move.uci()[0:2]) == self.game_board.king(self.color) and not dumber_board.is_check():
-                    return move
-                elif len(squares) == 1 and chess.parse_square(move.uci()[2:4]) == list(squares)[0] and not dumber_board.is_check():
-                    return move
-            return king_move
-        
-        #print(dumb_board)
-        #print(possible_moves)
-        for move in possible_moves:
-            
-            dumb_board = chess.Board(self.game_board.board_fen())
-            dumb_board.turn = self.color
-            if dumb_board.gives_check(move):
-                return move
+        move_codes = encode_moves(possible_moves)
+        move_from = from_squares(move_codes)
+        # attack maps of our board, built once for every tactic below
+        tactics = TacticalMaps(dumb_board, self.color)
+
+        king_captures = np.flatnonzero(tactics.king_captures(move_codes, self.opponent_king()[0]))
+        if len(king_captures) > 0:
+            return possible_moves[king_captures[0]]
+        
+        if tactics.in_check():
+            escapes = tactics.escapes(move_codes)
+            # take the checker if we can, else move the king, else block
+            takes_checker = escapes & moves_to(move_codes, tactics.checkers)
+            king_moves = escapes & (move_from == tactics.king)
+            for candidates in [takes_checker, king_moves, escapes]:
+                if candidates.any():
+                    return possible_moves[np.flatnonzero(candidates)[0]]
+        
+        checks = np.flatnonzero(tactics.gives_check(move_codes))
+        if len(checks) > 0:
+            return possible_moves[checks[0]]
     
             
     
@@ -575,7 +500,7 @@ class TheRookies(Player):
         #         if self.game_board.color_at(square) == self.color:
         #             #start_square = chess.parse_square(chess.square_name(square))
         #             start_square = square
-        #             end_square = self.chess_dict["k"][0][0]
+        #             end_square = self.opponent_king()[0]
         #             return chess.Move(start_square, end_square)
                 
                             
@@ -595,13 +520,22 @@ class TheRookies(Player):
         #print(self.game_board)
         
         
-        root = MCTS.MCTS_Node(state = dumb_board, reward_val = 0, color = self.color, width_iter = 0, depth_iter = 0, start_time = start_time)
+        root = self.reuse_search_tree(previous_tree, dumb_board, start_time)
+        if root is None:
+            root = MCTS.MCTS_Tree(state = dumb_board, color = self.color, start_time = start_time, table = self.transpositions)
+        self.exclude_blunders(root)
         #print("initialized root")
         # return an action
         #print("initialized a root, about to find best action")
         test_time = time.perf_counter()
         #print("time: 0")
-        selected_move = root.best_action()
+        root.search_seconds = self.time_manager.budget(
+            seconds_left, self.num_moves, len(root.root_children()),
+            in_check = dumb_board.is_check() or dumb_board.was_into_check(),
+            recent_capture = self.captured is not None or self.made_capture)
+        determinizations = [chess.Board(board.board_fen()) for board in self.particles.boards(self.search_pool.processes or SEARCH_DETERMINIZATIONS)]
+        selected_move = self.search_pool.best_action(root, determinizations)
+        self.search_tree = root
         
         #print(time.perf_counter()-test_time)
         #print("have selected the best action")
@@ -617,6 +551,64 @@ class TheRookies(Player):
             
         return choice
         
+    def exclude_blunders(self, root):
+        """
+        Scores the root's moves on boards sampled from the particle filter all at once, and keeps the search away
+        from the moves that do much worse than the best one across the boards the opponent may have.
+        """
+        # root_children may expand the root and grow the arrays, so it is called before root.moves is read
+        children = root.root_children()
+        codes = root.moves[children]
+        samples = self.particles.piece_bitboards(self.particles.sample(EVALUATION_SAMPLES))
+        mean, variance = evaluate_moves(samples, codes, self.color)
+        if len(codes) > 0:
+            score = mean - RISK_AVERSION * np.sqrt(variance)
+            root.excluded_moves = codes[score < score.max() - BLUNDER_MARGIN]
+    
+    def reuse_search_tree(self, tree, board, start_time):
+        """
+        Looks for the position we now believe we're in among the opponent replies searched last turn, under the move
+        we actually played. If no reply matches our board exactly, the most searched reply that agrees with everything
+        we know for sure (our own pieces and this turn's sense) is used. Returns the tree rerooted at that reply, or
+        None if the search has to start from scratch.
+        """
+        if tree is None:
+            return None
+        
+        board_fen = board.board_fen()
+        best_reply = None
+        for reply in tree.children(tree.root):
+            reply_board = tree.board(reply)
+            if reply_board.board_fen() == board_fen:
+                best_reply = reply
+                break
+            if self.agrees_with_evidence(reply_board, board) and (best_reply is None or tree.visits[reply] > tree.visits[best_reply]):
+                best_reply = reply
+        
+        if best_reply is None:
+            return None
+        pondered = self.release_pondering(best_reply) if tree is self.pondered_tree else None
+        if pondered is not None:
+            tree = pondered
+        else:
+            tree.reroot(best_reply)
+        tree.start_time = start_time
+        return tree
+    
+    def agrees_with_evidence(self, candidate, board):
+        """
+        Checks that candidate has our pieces where board has them, and matches the last sense result.
+        """
+        if candidate.occupied_co[self.color] != board.occupied_co[self.color]:
+            return False
+        for square in chess.scan_forward(board.occupied_co[self.color]):
+            if candidate.piece_type_at(square) != board.piece_type_at(square):
+                return False
+        for square, piece in self.last_sense:
+            if candidate.piece_at(square) != piece:
+                return False
+        return True
+        
     def handle_move_result(self, requested_move, taken_move, reason, captured_piece, captured_square):
         """
         This is a function called at the end of your turn/after your move was made and gives you the chance to update
@@ -629,13 +621,26 @@ class TheRookies(Player):
         """
         # TODO: implement this method
         #print(taken_move)
+        
+        # keep the part of the tree under the move that was actually made
+        subtree = None
+        if self.search_tree is not None and taken_move is not None:
+            children = self.search_tree.children(self.search_tree.root)
+            taken = np.flatnonzero(self.search_tree.moves[children] == encode_move(taken_move))
+            if len(taken) > 0:
+                self.search_tree.reroot(children[taken[0]])
+                subtree = self.search_tree
+        self.search_tree = subtree
+        self.made_capture = captured_piece
+        
         if taken_move is not None:
+            self.belief.our_move(taken_move, captured_square if captured_piece else None)
+            self.particles.our_move(taken_move, captured_square if captured_piece else None)
             #self.board.push(taken_move)
             
-            old_square = chess.parse_square(taken_move.uci()[0:2])
-            new_square = chess.parse_square(taken_move.uci()[2:4])
+            old_square, new_square = taken_move.from_square, taken_move.to_square
             
-            if (len(taken_move.uci()) == 4):
+            if not taken_move.promotion:
                 #print(old_square)
                 #print(new_square)
                 self.game_board.set_piece_at(new_square, self.game_board.piece_at(old_square))
@@ -656,8 +661,74 @@ class TheRookies(Player):
             
             
         self.num_moves = self.num_moves + 1
+        
+        self.start_pondering()
             
         pass
+    
+    def start_pondering(self):
+        """
+        Keeps searching the tree under the move we just made in a child process until our next turn starts, so the
+        replies we will look for in reuse_search_tree are already searched. If this turn left no tree, one is started
+        from our board. A process rather than a thread, because the opponent usually plays in our interpreter and a
+        pondering thread would hold the GIL during their turn. Inside a daemon worker (batch games, tournaments) no
+        child process can be started, so we don't ponder there.
+        """
+        self.release_pondering()
+        if multiprocessing.current_process().daemon:
+            return
+        if self.search_tree is None:
+            board = chess.Board(self.game_board.board_fen())
+            self.search_tree = MCTS.MCTS_Tree(state = board, color = not self.color, start_time = time.perf_counter(), table = self.transpositions)
+        # the replies are made here, so they are the same nodes in our copy of the tree and in the child's
+        if self.search_tree.num_children[self.search_tree.root] < 0:
+            self.search_tree.expand(self.search_tree.root, self.search_tree.root_board)
+        
+        self.ponder_stop = multiprocessing.Event()
+        self.ponder_connection, child_connection = multiprocessing.Pipe()
+        seed = int(np.random.randint(1 << 31))
+        self.ponder_process = multiprocessing.Process(target = MCTS._ponder_worker, args = (self.search_tree, self.ponder_stop, child_connection, seed), name = "TheRookiesPonder", daemon = True)
+        self.ponder_process.start()
+        child_connection.close()
+        self.pondered_tree = self.search_tree
+    
+    def stop_pondering(self):
+        """
+        Stops the background search and copies how often it visited each of the opponent's replies into our tree, so
+        reuse_search_tree can pick one. The subtrees stay in the child until release_pondering asks for one. The search
+        finishes the iteration it is on, so this takes a few milliseconds.
+        """
+        if self.ponder_process is not None and not self.ponder_stop.is_set():
+            self.ponder_stop.set()
+            try:
+                visits = self.ponder_connection.recv()
+                self.pondered_tree.visits[self.pondered_tree.children(self.pondered_tree.root)] = visits
+            except EOFError:
+                self.release_pondering()
+    
+    def release_pondering(self, reply=None):
+        """
+        Ends the ponder process. Given one of the opponent's replies in the pondered tree, the child's subtree under
+        it is taken back first, already rerooted, and given our transposition table again.
+
+        :return: MCTS.MCTS_Tree -- the pondered subtree, None if no reply was given or the child died
+        """
+        subtree = None
+        if self.ponder_process is not None:
+            self.stop_pondering()
+        if self.ponder_process is not None:
+            try:
+                self.ponder_connection.send(None if reply is None else int(reply))
+                if reply is not None:
+                    subtree = self.ponder_connection.recv()
+                    subtree.table = self.pondered_tree.table
+            except (EOFError, OSError):
+                subtree = None
+            self.ponder_connection.close()
+            self.ponder_process.join()
+            self.ponder_process = None
+            self.pondered_tree = None
+        return subtree
         
     def handle_game_end(self, winner_color, win_reason):  # possible GameHistory object...
         """
@@ -666,6 +737,11 @@ class TheRookies(Player):
         :param win_reason: String -- the reason for the game ending
         """
         # TODO: implement this method
+        self.release_pondering()
+        if self.search_pool is not None:
+            self.search_pool.close()
+            self.search_pool = None
+        
         if winner_color == chess.BLACK:
             print("Black wins due to " + win_reason)
             
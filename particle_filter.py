@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+
+"""
+File Name:      particle_filter.py
+Authors:        Nathan Wang + Celina Huang + Alex Vitale
+Date:           4/2/22
+
+Description:    Particle filter over the opponent's hidden pieces. Each particle is one complete guess of where the
+                opponent's pieces are, stored as six piece bitboards, and the whole set is moved, reweighted and
+                resampled with array operations. Sampled particles are the determinizations the search runs on.
+"""
+
+import numpy as np
+import chess
+
+from rollout_engine import bitboards_to_array, pseudo_legal_slots, SLOT_FROM, SLOT_TO
+
+
+# bytes per particle: the opponent's pawn ... king bitboards and a weight
+PARTICLE_BYTES = 6 * 8 + 8
+
+
+def _unpack(bitboards):
+    """
+    :param bitboards: (..., K) uint64
+    :return: (..., K, 64) uint8 -- the bits of every bitboard, square 0 first
+    """
+    bytes_ = np.ascontiguousarray(bitboards).view(np.uint8).reshape(bitboards.shape + (8,))
+    return np.unpackbits(bytes_, axis=-1, bitorder="little")
+
+
+def _popcount(bitboards):
+    return _unpack(bitboards).sum(axis=-1, dtype=np.int64)
+
+
+def _random_squares(masks, rng):
+    """
+    :param masks: (M,) uint64 bitboards
+    :return: (M,) -- a uniformly random square of every bitboard, 64 for empty ones
+    """
+    bits = _unpack(masks)
+    counts = bits.sum(axis=1)
+    picks = (rng.random(len(masks)) * counts).astype(np.intp)
+    squares = (np.cumsum(bits, axis=1) > picks[:, None]).argmax(axis=1)
+    return np.where(counts > 0, squares, 64)
+
+
+class ParticleFilter:
+    """
+    A fixed number of weighted particles, set by the memory budget. Senses and our own moves reweight the particles
+    that disagree with what we learned by mismatch_weight instead of dropping them, so the filter never runs out of
+    particles, and the set is resampled when its effective size falls below resample_fraction of the particles.
+    After a sense every particle is also corrected to match the sensed window, so determinizations always agree with
+    what we just saw. Castling and en passant are left out of the opponent's moves.
+    """
+
+    def __init__(self, board, color, megabytes=0.25, seed=None, mismatch_weight=1e-3, resample_fraction=0.5):
+        """
+        :param board: chess.BaseBoard -- the starting position
+        :param color: chess.WHITE or chess.BLACK -- our color
+        :param megabytes: float -- memory for the particles and their weights
+        """
+        self.color = color
+        # the opponent's side in rollout_engine arrays
+        self.sign = -1 if color == chess.WHITE else 1
+        self.mismatch_weight = mismatch_weight
+        self.resample_fraction = resample_fraction
+        self.rng = np.random.default_rng(seed)
+
+        num_particles = max(1, int(megabytes * 1024 * 1024 // PARTICLE_BYTES))
+        # our pieces are known exactly, so they are kept once
+        self.ours = np.array([board.pieces_mask(piece_type, color) for piece_type in chess.PIECE_TYPES],
+                             dtype=np.uint64)
+        theirs = [board.pieces_mask(piece_type, not color) for piece_type in chess.PIECE_TYPES]
+        self.particles = np.tile(np.array(theirs, dtype=np.uint64), (num_particles, 1))
+        self.weights = np.full(num_particles, 1 / num_particles)
+
+    def __len__(self):
+        return len(self.particles)
+
+    def _array(self):
+        """
+        :return: (N, 65) int8 -- every particle with our pieces, in the encoding of rollout_engine.boards_to_array
+        """
+        return bitboards_to_array(self.piece_bitboards(self.particles))
+
+    def occupied(self):
+        """
+        :return: (N,) uint64 -- the squares of the opponent's pieces in every particle
+        """
+        return np.bitwise_or.reduce(self.particles, axis=1)
+
+    def effective_size(self):
+        """
+        :return: float -- the number of equally weighted particles the current weights are worth
+        """
+        return 1 / np.square(self.weights).sum()
+
+    def _reweight(self, consistent):
+        """
+        Weighs down the particles that disagree with an observation and resamples if too few carry the weight.
+
+        :param consistent: (N,) bool -- True for the particles that agree with it
+        """
+        weights = self.weights * np.where(consistent, 1.0, self.mismatch_weight)
+        self.weights = weights / weights.sum()
+        if self.effective_size() < self.resample_fraction * len(self):
+            self.resample()
+
+    def resample(self):
+        """
+        Systematic resampling: draws len(self) particles in proportion to their weights, with one random offset.
+        """
+        positions = (self.rng.random() + np.arange(len(self))) / len(self)
+        picks = np.minimum(np.searchsorted(np.cumsum(self.weights), positions), len(self) - 1)
+        self.particles = self.particles[picks]
+        self.weights = np.full(len(self), 1 / len(self))
+
+    def _move_our_piece(self, from_square, to_square, promotion=None):
+        piece = int(np.flatnonzero((self.ours >> np.uint64(from_square)) & np.uint64(1))[0])
+        self.ours[piece] &= ~np.uint64(chess.BB_SQUARES[from_square])
+        self.ours[(promotion - 1) if promotion else piece] |= np.uint64(chess.BB_SQUARES[to_square])
+        return piece
+
+    def our_move(self, move, captured_square=None):
+        """
+        :param move: chess.Move -- the move that was actually made
+        :param captured_square: chess.Square -- where we captured a piece, None if we didn't
+        """
+        piece = self._move_our_piece(move.from_square, move.to_square, move.promotion)
+        if piece == chess.KING - 1 and chess.square_distance(move.from_square, move.to_square) == 2:
+            if move.to_square > move.from_square:
+                self._move_our_piece(move.to_square + 1, move.to_square - 1)
+            else:
+                self._move_our_piece(move.to_square - 2, move.to_square + 1)
+
+        # the squares we moved through were empty, and the one we captured on wasn't
+        captured = np.uint64(chess.BB_SQUARES[captured_square] if captured_square is not None else 0)
+        path = chess.between(move.from_square, move.to_square) | chess.BB_SQUARES[move.to_square]
+        empty = np.uint64(path) & ~captured
+        occupied = self.occupied()
+        self._reweight(((occupied & empty) == 0) & ((occupied & captured) == captured))
+        self.particles &= ~captured
+        self._correct(empty, np.zeros(6, dtype=np.uint64))
+
+    def opponent_moved(self, captured_square=None):
+        """
+        Plays a random pseudo-legal move of the opponent in every particle, a capture on captured_square if they
+        captured there, and never a capture otherwise.
+
+        :param captured_square: chess.Square -- where the opponent captured our piece, None if they didn't
+        """
+        array = self._array()
+        boards, slots = pseudo_legal_slots(array, self.sign)
+        targets = SLOT_TO[slots]
+        if captured_square is None:
+            usable = array[boards, targets] * self.sign >= 0
+        else:
+            usable = targets == captured_square
+        boards, slots = boards[usable], slots[usable]
+
+        # a uniformly random move per particle, from the moves grouped by particle
+        counts = np.bincount(boards, minlength=len(self))
+        has_moves = counts > 0
+        picks = np.cumsum(counts) - counts + (self.rng.random(len(self)) * counts).astype(np.intp)
+        movers, chosen = np.flatnonzero(has_moves), slots[picks[has_moves]]
+
+        from_squares, to_squares = SLOT_FROM[chosen], SLOT_TO[chosen]
+        pieces = np.abs(array[movers, from_squares])
+        promotes = (pieces == chess.PAWN) & ((to_squares >> 3 == 0) | (to_squares >> 3 == 7))
+        moved = np.where(promotes, chess.QUEEN, pieces) - 1
+        one = np.uint64(1)
+        self.particles[movers, pieces - 1] &= ~(one << from_squares.astype(np.uint64))
+        self.particles[movers, moved] |= one << to_squares.astype(np.uint64)
+
+        if captured_square is not None:
+            self.ours &= ~np.uint64(chess.BB_SQUARES[captured_square])
+            self._reweight(has_moves)
+
+    def sense(self, sense_result):
+        """
+        :param sense_result: List((chess.Square, chess.Piece)) -- as passed to handle_sense_result
+        """
+        window = 0
+        observed = np.zeros(6, dtype=np.uint64)
+        for square, piece in sense_result:
+            window |= chess.BB_SQUARES[square]
+            if piece is not None and piece.color != self.color:
+                observed[piece.piece_type - 1] |= np.uint64(chess.BB_SQUARES[square])
+        window = np.uint64(window)
+
+        self._reweight(((self.particles & window) == observed).all(axis=1))
+        self._correct(window, observed)
+
+    def _correct(self, window, observed):
+        """
+        Makes every particle show the observed pieces in the window: what a sense saw there, or nothing on the
+        squares our move passed through. A piece that shows up where the particle didn't have it comes from a random
+        square of that type outside the window, and a piece the particle had in the window but that isn't there goes
+        to a random empty square outside it.
+        """
+        before = _popcount(self.particles)
+        self.particles = (self.particles & ~window) | observed
+        extra = _popcount(self.particles) - before
+
+        outside = ~window & ~np.bitwise_or.reduce(self.ours)
+        no_back_ranks = np.uint64(chess.BB_ALL & ~chess.BB_BACKRANKS)
+        while (extra != 0).any():
+            rows, types = np.nonzero(extra > 0)
+            squares = _random_squares(self.particles[rows, types] & ~window, self.rng)
+            found = squares < 64
+            self.particles[rows[found], types[found]] &= ~(np.uint64(1) << squares[found].astype(np.uint64))
+            extra[rows, types] -= 1
+
+            # one piece per particle at a time, so two pieces can't be put on the same square
+            rows, types = np.nonzero(extra < 0)
+            rows, first = np.unique(rows, return_index=True)
+            types = types[first]
+            free = outside & ~self.occupied()[rows]
+            free &= np.where(types == chess.PAWN - 1, no_back_ranks, ~np.uint64(0))
+            squares = _random_squares(free, self.rng)
+            placed = squares < 64
+            self.particles[rows[placed], types[placed]] |= np.uint64(1) << squares[placed].astype(np.uint64)
+            extra[rows, types] += 1
+
+    def sample(self, k):
+        """
+        :param k: int -- the number of particles to draw
+        :return: (k, 6) uint64 -- the opponent's pawn ... king bitboards of particles drawn by weight
+        """
+        return self.particles[self.rng.choice(len(self), size=k, p=self.weights)]
+
+    def piece_bitboards(self, particles):
+        """
+        :param particles: (K, 6) uint64 -- particles from sample
+        :return: (K, 12) uint64 -- full boards in the order of evaluation.piece_bitboards
+        """
+        ours = np.broadcast_to(self.ours, particles.shape)
+        return np.concatenate([ours, particles] if self.color == chess.WHITE else [particles, ours], axis=1)
+
+    def boards(self, k):
+        """
+        :param k: int -- the number of determinizations
+        :return: List(chess.BaseBoard) -- our pieces with the opponent's pieces of k particles drawn by weight
+        """
+        boards = []
+        for particle in self.sample(k):
+            board = chess.BaseBoard.empty()
+            for color, masks in [(self.color, self.ours), (not self.color, particle)]:
+                for piece_type, mask in zip(chess.PIECE_TYPES, masks):
+                    for square in chess.scan_forward(int(mask)):
+                        board.set_piece_at(square, chess.Piece(piece_type, color))
+            boards.append(board)
+        return boards
@@ -10,27 +10,121 @@ Source:         Adapted from recon-chess (https://pypi.org/project/reconchess/)
 """
 
 import argparse
+import multiprocessing
+import os
 import random
+import sys
+import time
 import chess
-from player import load_player
+import numpy as np
+from player import load_player, load_cached_player, preload_players
 from game import Game
+from game_clock import OPPONENT_RESULT, SENSE, MOVE, PHASES, PLAYER_PHASES
+from log_writer import BackgroundWriter
+from game_record import GameArchive, encode_game, record_of
 from datetime import datetime
-import time
+
+# the Player callbacks play_batch reports the latency of, in the order they come in a game
+CALLBACKS = ("handle_game_start", "handle_opponent_move_result", "choose_sense", "handle_sense_result", "choose_move",
+             "handle_move_result", "handle_game_end")
+
+# a player that spends longer than this in its own callbacks on a single turn passes instead of moving
+MAX_SECONDS_PER_TURN = 60
 
 
-def play_local_game(white_player, black_player, player_names):
+def play_local_game(white_player, black_player, player_names, writer=None, archive=None):
     players = [black_player, white_player]
 
     game = Game()
+    # a writer passed in belongs to the caller and is left running
+    own_writer = writer is None
+    if own_writer:
+        writer = BackgroundWriter()
 
     # writing to files
-    time = "{}".format(datetime.today()).replace(" ", "_").replace(":", "-").replace(".", "-")
-    filename_game = "GameHistory/" + time + "game_boards.txt"
-    filename_true = "GameHistory/" + time + "true_boards.txt"
-    output = open(filename_game, "w")
-    output_true = open(filename_true, "w")
-    output.write("Starting Game between {}-WHITE and {}-BLACK\n".format(player_names[0], player_names[1]))
-    output_true.write("Starting Game between {}-WHITE and {}-BLACK\n".format(player_names[0], player_names[1]))
+    timestamp = "{}".format(datetime.today()).replace(" ", "_").replace(":", "-").replace(".", "-")
+    filename_game = "GameHistory/" + timestamp + "game_boards.txt"
+    filename_true = "GameHistory/" + timestamp + "true_boards.txt"
+    output = output_true = None
+    try:
+        output = open(filename_game, "w")
+        output_true = open(filename_true, "w")
+        writer.write(output, "Starting Game between {}-WHITE and {}-BLACK\n".format(player_names[0], player_names[1]))
+        writer.write(output_true, "Starting Game between {}-WHITE and {}-BLACK\n".format(player_names[0], player_names[1]))
+
+        white_player.handle_game_start(chess.WHITE, chess.Board())
+        black_player.handle_game_start(chess.BLACK, chess.Board())
+        game.start()
+
+        move_number = 1
+        while not game.is_over():
+            with game.clock.paused():
+                if game.turn:
+                    writer.write(output, "##################################--WHITE's Turn [{}]\n".format(move_number))
+                    writer.write(output, "##################################--Current Board State\n")
+                    writer.submit(write_board_fen, output, game.white_board.board_fen())
+                    writer.write(output_true, "##################################--WHITE's Turn [{}]\n".format(move_number))
+
+                    writer.print("WHITE's Turn [{}]".format(move_number))
+                    writer.submit(print_board_fen, game.white_board.board_fen())
+
+                else:
+                    writer.write(output, "##################################--BLACK's Turn [{}]\n".format(move_number))
+                    writer.write(output, "##################################--Current Board State \n")
+                    writer.submit(write_board_fen, output, game.black_board.board_fen())
+                    writer.write(output_true, "##################################--BLACK's Turn [{}]\n".format(move_number))
+
+                    writer.print("BLACK's Turn [{}]".format(move_number))
+                    writer.submit(print_board_fen, game.black_board.board_fen())
+
+                writer.write(output_true, "##################################--Current Board State\n")
+                writer.submit(write_board_fen, output_true, game.truth_board.board_fen())
+
+            requested_move, taken_move = play_turn(game, players[game.turn], game.turn, move_number, output, output_true,
+                                                   writer)
+            with game.clock.paused():
+                print_game(game, move_number, game.turn, requested_move, taken_move, writer)
+                move_number += 1
+
+                writer.print("==================================\n")
+
+        winner_color, winner_reason = game.get_winner()
+        game.end()
+
+        white_player.handle_game_end(winner_color, winner_reason)
+        black_player.handle_game_end(winner_color, winner_reason)
+
+        if archive is not None:
+            archive.append(record_of(game, winner_color, winner_reason))
+
+        writer.write(output, "Game Over!\n")
+        if winner_color is not None:
+            writer.write(output, winner_reason)
+        else:
+            writer.write(output, 'Draw!')
+        writer.write(output, "\n")
+        writer.write(output, clock_summary(game, player_names))
+    finally:
+        # wait for the writer to catch up before the files are closed, even if a player raised
+        if own_writer:
+            writer.close()
+        else:
+            writer.flush()
+        for out in (output, output_true):
+            if out is not None:
+                out.close()
+    return winner_color, winner_reason
+
+
+def play_headless_game(white_player, black_player):
+    """
+    Plays a game without any logging or console output.
+
+    :return: chess.WHITE/chess.BLACK/None, str, Game -- the winning color, the winning reason and the finished game
+    """
+    players = [black_player, white_player]
+
+    game = Game()
 
     white_player.handle_game_start(chess.WHITE, chess.Board())
     black_player.handle_game_start(chess.BLACK, chess.Board())
@@ -38,113 +132,216 @@ def play_local_game(white_player, black_player, player_names):
 
     move_number = 1
     while not game.is_over():
-        if game.turn:
-            output.write("##################################--WHITE's Turn [{}]\n".format(move_number))
-            output.write("##################################--Current Board State\n")
-            format_write_board(output, game.white_board)
-            output_true.write("##################################--WHITE's Turn [{}]\n".format(move_number))
-
-            print("WHITE's Turn [{}]".format(move_number))
-            format_print_board(game.white_board)
-
-        else:
-            output.write("##################################--BLACK's Turn [{}]\n".format(move_number))
-            output.write("##################################--Current Board State \n")
-            format_write_board(output, game.black_board)
-            output_true.write("##################################--BLACK's Turn [{}]\n".format(move_number))
-
-            print("BLACK's Turn [{}]".format(move_number))
-            format_print_board(game.black_board)
-
-        output_true.write("##################################--Current Board State\n")
-        format_write_board(output_true, game.truth_board)
-
-        requested_move, taken_move = play_turn(game, players[game.turn], game.turn, move_number, output, output_true)
-        print_game(game, move_number, game.turn, requested_move, taken_move)
+        play_turn(game, players[game.turn], game.turn, move_number)
         move_number += 1
 
-        print("==================================\n")
-
     winner_color, winner_reason = game.get_winner()
+    game.end()
 
     white_player.handle_game_end(winner_color, winner_reason)
     black_player.handle_game_end(winner_color, winner_reason)
-
-    output.write("Game Over!\n")
+    return winner_color, winner_reason, game
+
+
+def init_worker(source_paths):
+    """
+    Process pool initializer for headless games. Silences the console and imports every player once, so the
+    worker can build fresh players for each of its games without importing them again.
+
+    :param source_paths: List(str) -- paths to the bot source files the worker will play
+    """
+    sys.stdout = open(os.devnull, "w")
+    preload_players(source_paths)
+
+
+class CallbackTimer:
+    """
+    Stands in for a player and records how long each of its CALLBACKS takes, call by call. Everything else is passed
+    through to the player untouched.
+    """
+
+    def __init__(self, player):
+        self.player = player
+        self.seconds = {callback: [] for callback in CALLBACKS}
+
+    def __getattr__(self, name):
+        method = getattr(self.player, name)
+        if name not in CALLBACKS:
+            return method
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.seconds[name].append(time.perf_counter() - start)
+        return timed
+
+
+def _play_batch_game(args):
+    """
+    Plays game number `index` of a batch in a worker process. The first agent is WHITE in even numbered games. The
+    game's binary record is only built when `record` is set, so a batch without an archive doesn't pay for it.
+
+    :return: dict -- the winner's agent index (or None for a draw), the reason, the number of turns, the seconds of
+             every call of each callback by agent and the encoded record (None unless `record`)
+    """
+    paths, index, record = args
+    order = [0, 1] if index % 2 == 0 else [1, 0]
+    players = []
+    for i in order:
+        name, constructor = load_cached_player(paths[i])
+        players.append(CallbackTimer(constructor()))
+
+    winner_color, winner_reason, game = play_headless_game(players[0], players[1])
+
+    timers = {order[0]: players[0], order[1]: players[1]}
+    winner = None
     if winner_color is not None:
-        output.write(winner_reason)
-    else:
-        output.write('Draw!')
-    return winner_color, winner_reason
-
-
-def play_turn(game, player, turn, move_number, output, output_true):
+        winner = order[0] if winner_color == chess.WHITE else order[1]
+    return {
+        "winner": winner,
+        "reason": winner_reason,
+        "turns": len(game.truth_board.move_stack),
+        "callback_seconds": [timers[i].seconds for i in range(2)],
+        "record": encode_game(record_of(game, winner_color, winner_reason)) if record else None,
+    }
+
+
+def play_batch(first_path, second_path, num_games, processes=None, archive=None):
+    """
+    Plays `num_games` headless games between two agents across a process pool, alternating colors, and prints the
+    aggregate results.
+
+    :param first_path: str -- path to the first bot source file
+    :param second_path: str -- path to the second bot source file
+    :param num_games: int -- the number of games to play
+    :param processes: int -- the number of worker processes, defaults to the number of CPUs
+    :param archive: GameArchive -- if given, every game is appended to it
+
+    :return: List(dict) -- the result of every game, in the order they finished
+    """
+    names = [load_player(first_path)[0], load_player(second_path)[0]]
+    paths = [first_path, second_path]
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(processes, initializer=init_worker, initargs=(paths,)) as pool:
+        results = []
+        for result in pool.imap_unordered(_play_batch_game, [(paths, i, archive is not None) for i in range(num_games)]):
+            if archive is not None:
+                archive.append(result["record"])
+            results.append(result)
+    elapsed = time.perf_counter() - start
+
+    print("Played {} games in {:.2f}s ({:.2f} games/sec)".format(num_games, elapsed, num_games / elapsed))
+    wins = [sum(1 for r in results if r["winner"] == i) for i in range(2)]
+    draws = sum(1 for r in results if r["winner"] is None)
+    for i in range(2):
+        print("{} ({}) won {} games".format(names[i], paths[i], wins[i]))
+    print("Draws: {}".format(draws))
+    print("Average game length: {:.1f} turns".format(sum(r["turns"] for r in results) / max(len(results), 1)))
+
+    # latency of each callback over all its calls, in milliseconds
+    for i in range(2):
+        print("{} callback latency (mean / p50 / p95 / max ms over calls):".format(names[i]))
+        for callback in CALLBACKS:
+            seconds = np.array([s for r in results for s in r["callback_seconds"][i][callback]])
+            if len(seconds) == 0:
+                continue
+            p50, p95 = 1000 * np.percentile(seconds, [50, 95])
+            print("  {:<28} {:>9.3f} {:>9.3f} {:>9.3f} {:>9.3f}  ({} calls)".format(
+                callback, 1000 * seconds.mean(), p50, p95, 1000 * seconds.max(), len(seconds)))
+    return results
+
+
+def clock_summary(game, player_names):
+    summary = ""
+    for name, color in zip(player_names, [chess.WHITE, chess.BLACK]):
+        phase_seconds = game.clock.phase_seconds(color)
+        summary += "{}-{} time used -- ".format(name, chess.COLOR_NAMES[color].upper())
+        summary += " ".join("{}: {:.3f}s".format(phase, phase_seconds[phase]) for phase in PHASES)
+        summary += "\n"
+    return summary
+
+
+def play_turn(game, player, turn, move_number, output=None, output_true=None, writer=None):
     possible_moves = game.get_moves()
     possible_sense = list(chess.SQUARES)
 
     # notify the player of the previous opponent's move
     captured_square = game.opponent_move_result()
-    start = time.time()
-    player.handle_opponent_move_result(captured_square is not None, captured_square)
+    with game.clock.charging(OPPONENT_RESULT):
+        player.handle_opponent_move_result(captured_square is not None, captured_square)
 
     # play sense action
-    sense = player.choose_sense(possible_sense, possible_moves, game.get_seconds_left())
+    with game.clock.charging(SENSE):
+        sense = player.choose_sense(possible_sense, possible_moves, game.get_seconds_left())
     sense_result = game.handle_sense(sense)
-    player.handle_sense_result(sense_result)
-    print_sense(game, turn, sense)
+    with game.clock.charging(SENSE):
+        player.handle_sense_result(sense_result)
 
-    output.write("##################################--Sense Around Square {}\n".format(chess.SQUARE_NAMES[sense]))
-    if turn:
-        format_write_board(output, game.white_board)
-    else:
-        format_write_board(output, game.black_board)
+    if writer is not None:
+        with game.clock.paused():
+            print_sense(game, turn, sense, writer)
+
+            writer.write(output, "##################################--Sense Around Square {}\n".format(chess.SQUARE_NAMES[sense]))
+            if turn:
+                writer.submit(write_board_fen, output, game.white_board.board_fen())
+            else:
+                writer.submit(write_board_fen, output, game.black_board.board_fen())
 
     # play move action
-    move = player.choose_move(possible_moves, game.get_seconds_left())
-    end = time.time()
-    if end - start > 60:
+    with game.clock.charging(MOVE):
+        move = player.choose_move(possible_moves, game.get_seconds_left())
+    if game.clock.turn_seconds(PLAYER_PHASES) > MAX_SECONDS_PER_TURN:
         game.took_to_long_to_move = True
-        print('Took too long to move')
+        if writer is not None:
+            writer.print('Took too long to move')
     requested_move, taken_move, captured_square, reason = game.handle_move(move)
     game.took_to_long_to_move = False
-    player.handle_move_result(requested_move, taken_move, reason, captured_square is not None,
-                              captured_square)
-
-    output.write("##################################--Move requested: {} -- Move taken: {}\n".format(requested_move, taken_move))
-    output_true.write("##################################--Move requested: {} -- Move taken: {}\n\n".format(requested_move, taken_move))
-    if turn:
-        format_write_board(output, game.white_board)
-    else:
-        format_write_board(output, game.black_board)
-
-    output.write("##################################--Truth Board State\n")
-    format_write_board(output, game.truth_board)
+    with game.clock.charging(MOVE):
+        player.handle_move_result(requested_move, taken_move, reason, captured_square is not None,
+                                  captured_square)
+
+    if writer is not None:
+        with game.clock.paused():
+            writer.write(output, "##################################--Move requested: {} -- Move taken: {}\n".format(requested_move, taken_move))
+            writer.write(output_true, "##################################--Move requested: {} -- Move taken: {}\n\n".format(requested_move, taken_move))
+            if turn:
+                writer.submit(write_board_fen, output, game.white_board.board_fen())
+            else:
+                writer.submit(write_board_fen, output, game.black_board.board_fen())
+
+            writer.write(output, "##################################--Truth Board State\n")
+            writer.submit(write_board_fen, output, game.truth_board.board_fen())
 
     game.end_turn()
     return requested_move, taken_move
 
 
-def print_game(game, move_number, turn, move_requested, move_taken):
+def print_game(game, move_number, turn, move_requested, move_taken, writer):
     if not turn:
-        print("[WHITE]-- Move requested: {} -- Move taken: {}".format(move_requested, move_taken))
-        format_print_board(game.white_board)
+        writer.print("[WHITE]-- Move requested: {} -- Move taken: {}".format(move_requested, move_taken))
+        writer.submit(print_board_fen, game.white_board.board_fen())
     else:
-        print("[BLACK]-- Move requested: {} -- Move taken: {}".format(move_requested, move_taken))
-        format_print_board(game.black_board)
+        writer.print("[BLACK]-- Move requested: {} -- Move taken: {}".format(move_requested, move_taken))
+        writer.submit(print_board_fen, game.black_board.board_fen())
 
 
-def print_sense(game, turn, sense):
+def print_sense(game, turn, sense, writer):
     if turn:
-        print("[WHITE]-- Sense Around Square {} --".format(chess.SQUARE_NAMES[sense]))
-        format_print_board(game.white_board)
+        writer.print("[WHITE]-- Sense Around Square {} --".format(chess.SQUARE_NAMES[sense]))
+        writer.submit(print_board_fen, game.white_board.board_fen())
     else:
-        print("[BLACK]-- Sense Around Square {} --".format(chess.SQUARE_NAMES[sense]))
-        format_print_board(game.black_board)
+        writer.print("[BLACK]-- Sense Around Square {} --".format(chess.SQUARE_NAMES[sense]))
+        writer.submit(print_board_fen, game.black_board.board_fen())
 
 
-def format_print_board(board):
+def format_board_fen(fen):
+    """
+    Draws the board described by the board part of a FEN as a grid, one line per rank plus a trailing blank line.
+    """
     rows = ['8', '7', '6', '5', '4', '3', '2', '1']
-    fen = board.board_fen()
 
     fb = "   A   B   C   D   E   F   G   H  "
     fb += rows[0]
@@ -154,56 +351,50 @@ def format_print_board(board):
             fb += '|' + rows[ind]
             ind += 1
         elif f.isnumeric():
-            for i in range(int(f)):
-                fb += '|   '
+            fb += '|   ' * int(f)
         else:
             fb += '| ' + f + ' '
     fb += '|'
 
-    ind = 0
-    for i in range(9):
-        for j in range(34):
-            print(fb[ind], end='')
-            ind += 1
-        print('\n', end='')
-    print("")
+    return "".join(fb[i:i + 34] + '\n' for i in range(0, 9 * 34, 34)) + '\n'
 
 
-def format_write_board(out, board):
-    rows = ['8', '7', '6', '5', '4', '3', '2', '1']
-    fen = board.board_fen()
+def print_board_fen(fen):
+    print(format_board_fen(fen), end='')
 
-    fb = "   A   B   C   D   E   F   G   H  "
-    fb += rows[0]
-    ind = 1
-    for f in fen:
-        if f == '/':
-            fb += '|' + rows[ind]
-            ind += 1
-        elif f.isnumeric():
-            for i in range(int(f)):
-                fb += '|   '
-        else:
-            fb += '| ' + f + ' '
-    fb += '|'
 
-    ind = 0
-    for i in range(9):
-        for j in range(34):
-            out.write(fb[ind])
-            ind += 1
-        out.write('\n')
-    out.write('\n')
+def write_board_fen(out, fen):
+    out.write(format_board_fen(fen))
+
+
+def format_print_board(board):
+    print_board_fen(board.board_fen())
+
+
+def format_write_board(out, board):
+    write_board_fen(out, board.board_fen())
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Allows you to play against a bot. Useful for testing and debugging.')
     parser.add_argument('first_path', help='Path to first bot source file.')
     parser.add_argument('second_path', help='Path to second bot source file.')
+    parser.add_argument('--games', type=int, default=None,
+                        help='Play this many headless games, alternating colors, and report aggregate results.')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='Number of worker processes for --games. Defaults to the number of CPUs.')
+    parser.add_argument('--record', default=None,
+                        help='Append the binary record of every game to this archive file.')
     # parser.add_argument('--color', default='random', choices=['white', 'black', 'random'],
     #                    help='The color you want to play as.')
     args = parser.parse_args()
 
+    archive = GameArchive(args.record) if args.record else None
+
+    if args.games is not None:
+        play_batch(args.first_path, args.second_path, args.games, args.processes, archive)
+        sys.exit(0)
+
     name_one, constructor_one = load_player(args.first_path)
     player_one = constructor_one()
     name_two, constructor_two = load_player(args.second_path)
@@ -218,7 +409,13 @@ if __name__ == '__main__':
             players.reverse()
             player_names.reverse()
 
-    win_color, win_reason = play_local_game(players[0], players[1], player_names)
+    # a human needs the boards on screen before being asked for input, so write synchronously
+    writer = BackgroundWriter(synchronous="Human" in player_names)
+
+    try:
+        win_color, win_reason = play_local_game(players[0], players[1], player_names, writer=writer, archive=archive)
+    finally:
+        writer.close()
 
     print('Game Over!')
     if win_color is not None:
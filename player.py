@@ -21,6 +21,10 @@ class Player(object):
         pass
 
 
+# players already loaded in this process, by source path
+_loaded_players = {}
+
+
 def load_player(source_path):
     """
     This is function loads a subclass of the Player class that is contained in a python source file or python module.
@@ -35,8 +39,12 @@ def load_player(source_path):
         abs_source_path = os.path.abspath(source_path)
 
         # insert the directory of the bot source file into system path so we can import it
-        # note: insert it first so we know we are searching this first
-        sys.path.insert(0, os.path.dirname(abs_source_path))
+        # note: insert it first so we know we are searching this first, without piling up duplicate entries
+        source_dir = os.path.dirname(abs_source_path)
+        if sys.path[0] != source_dir:
+            if source_dir in sys.path:
+                sys.path.remove(source_dir)
+            sys.path.insert(0, source_dir)
 
         # import_module expects a module name, so remove the extension
         module_name = os.path.splitext(os.path.basename(abs_source_path))[0]
@@ -50,4 +58,28 @@ def load_player(source_path):
     elif len(players) > 1:
         raise RuntimeError(
             '{} contained multiple subclasses of {}: {}. Should have exactly 1'.format(source_path, players, Player))
-    return players[0]
\ No newline at end of file
+    return players[0]
+
+
+def load_cached_player(source_path):
+    """
+    Same as load_player, but each source file is only imported and inspected once per process. Worker processes
+    that play many games use this to build a fresh Player for every game without paying for the import again.
+
+    :param source_path: the path to the source file to load
+    :return: Tuple where the first element is the name of the loaded class, and the second element is the class type
+    """
+    if source_path not in _loaded_players:
+        _loaded_players[source_path] = load_player(source_path)
+    return _loaded_players[source_path]
+
+
+def preload_players(source_paths):
+    """
+    Loads every player in `source_paths` into this process. Meant to be used as a process pool initializer so the
+    imports happen once per worker, before any game starts.
+
+    :param source_paths: List(str) -- paths to the source files to load
+    """
+    for source_path in source_paths:
+        load_cached_player(source_path)
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+
+"""
+File Name:      rollout_engine.py
+Authors:        Nathan Wang + Celina Huang + Alex Vitale
+Date:           4/2/22
+
+Description:    Vectorized random playouts for MCTS. Hundreds of playouts are advanced in lockstep on NumPy arrays,
+                with every move chosen uniformly at random from the pseudo-legal moves of its board.
+"""
+
+import numpy as np
+import chess
+from evaluation import batch_material
+
+
+_EMPTY_SQUARE = 64
+_ORTHOGONAL, _DIAGONAL, _KNIGHT = 0, 1, 2
+
+# how a piece may use a slot: not at all, onto any square but its own pieces, pawn push, pawn capture
+_NONE, _NORMAL, _PUSH, _CAPTURE = 0, 1, 2, 3
+
+# allowed[category * 3 + target], where target is 0 for an enemy piece, 1 for empty and 2 for an own piece
+_ALLOWED = np.array([False, False, False,
+                     True, True, False,
+                     False, True, False,
+                     True, False, False])
+
+
+def _build_slot_tables():
+    """
+    Every (from, to) pair a piece could ever move along on an empty board -- the queen rays plus the knight jumps --
+    numbered as move slots, plus one last slot from the always empty square 64 to itself that is used as padding.
+    """
+    slots = []
+    for from_square in chess.SQUARES:
+        rays = chess.BB_RANK_ATTACKS[from_square][0] | chess.BB_FILE_ATTACKS[from_square][0]
+        for to_square in chess.scan_forward(rays):
+            slots.append((from_square, to_square, _ORTHOGONAL))
+        for to_square in chess.scan_forward(chess.BB_DIAG_ATTACKS[from_square][0]):
+            slots.append((from_square, to_square, _DIAGONAL))
+        for to_square in chess.scan_forward(chess.BB_KNIGHT_ATTACKS[from_square]):
+            slots.append((from_square, to_square, _KNIGHT))
+    slots.append((_EMPTY_SQUARE, _EMPTY_SQUARE, _KNIGHT))
+
+    from_squares = np.array([s[0] for s in slots], dtype=np.intp)
+    to_squares = np.array([s[1] for s in slots], dtype=np.intp)
+    kinds = np.array([s[2] for s in slots], dtype=np.int8)
+    # ray table: the squares strictly between from and to, as a bitboard
+    between = np.array([chess.between(f, t) if k != _KNIGHT else 0 for f, t, k in slots], dtype=np.uint64)
+    return from_squares, to_squares, kinds, between
+
+
+SLOT_FROM, SLOT_TO, SLOT_KIND, SLOT_BETWEEN = _build_slot_tables()
+NUM_SLOTS = len(SLOT_FROM) - 1
+_PAD_SLOT = NUM_SLOTS
+
+
+def _build_piece_tables(sign):
+    """
+    :param sign: 1 for WHITE, -1 for BLACK
+    :return: the category of every slot for every piece type, shape (7, num slots + 1), and the candidate slots of
+             every piece type on every square: all of them concatenated, their categories, and the start and length
+             of each piece type and square's list, shape (7, 64)
+    """
+    rank_delta = (SLOT_TO >> 3) - (SLOT_FROM >> 3)
+    file_delta = (SLOT_TO & 7) - (SLOT_FROM & 7)
+    distance = np.maximum(np.abs(rank_delta), np.abs(file_delta))
+    real = SLOT_FROM < _EMPTY_SQUARE
+    forward = sign * rank_delta
+    start_rank = 1 if sign == 1 else 6
+
+    categories = np.zeros((7, len(SLOT_FROM)), dtype=np.int8)
+    categories[chess.KNIGHT][real & (SLOT_KIND == _KNIGHT)] = _NORMAL
+    categories[chess.BISHOP][real & (SLOT_KIND == _DIAGONAL)] = _NORMAL
+    categories[chess.ROOK][real & (SLOT_KIND == _ORTHOGONAL)] = _NORMAL
+    categories[chess.QUEEN][real & (SLOT_KIND != _KNIGHT)] = _NORMAL
+    categories[chess.KING][real & (SLOT_KIND != _KNIGHT) & (distance == 1)] = _NORMAL
+    pushes = (file_delta == 0) & ((forward == 1) | (forward == 2) & (SLOT_FROM >> 3 == start_rank))
+    categories[chess.PAWN][real & pushes] = _PUSH
+    categories[chess.PAWN][real & (SLOT_KIND == _DIAGONAL) & (distance == 1) & (forward == 1)] = _CAPTURE
+
+    # the slots each piece type could move along from each square, concatenated, with where each list starts
+    slot_lists = [np.flatnonzero((categories[piece_type] != _NONE) & (SLOT_FROM == square))
+                  for piece_type in range(7) for square in chess.SQUARES]
+    counts = np.array([len(slots) for slots in slot_lists], dtype=np.intp).reshape(7, 64)
+    starts = (np.cumsum(counts) - counts.ravel()).reshape(7, 64)
+    candidates = np.concatenate(slot_lists)
+    return categories, candidates, categories[np.repeat(np.arange(7), counts.sum(axis=1)), candidates], starts, counts
+
+
+_CATEGORIES = {}
+_CANDIDATES = {}
+_CANDIDATE_CATEGORIES = {}
+_CANDIDATE_STARTS = {}
+_CANDIDATE_COUNTS = {}
+for _sign in (1, -1):
+    (_CATEGORIES[_sign], _CANDIDATES[_sign], _CANDIDATE_CATEGORIES[_sign], _CANDIDATE_STARTS[_sign],
+     _CANDIDATE_COUNTS[_sign]) = _build_piece_tables(_sign)
+
+# every slot into each square, padded with _PAD_SLOT; index 64 (no square) has only padding
+_SLOTS_INTO = np.full((65, 35), _PAD_SLOT, dtype=np.intp)
+for _square in chess.SQUARES:
+    _into = np.flatnonzero(SLOT_TO[:NUM_SLOTS] == _square)
+    _SLOTS_INTO[_square, :len(_into)] = _into
+
+
+def boards_to_array(boards):
+    """
+    Encodes boards as an (N, 65) int8 array: +piece type for WHITE, -piece type for BLACK, 0 for empty squares.
+    Column 64 is always empty.
+    """
+    array = np.zeros((len(boards), 65), dtype=np.int8)
+    for i, board in enumerate(boards):
+        for color, sign in [(chess.WHITE, 1), (chess.BLACK, -1)]:
+            for piece_type in chess.PIECE_TYPES:
+                for square in chess.scan_forward(board.pieces_mask(piece_type, color)):
+                    array[i, square] = sign * piece_type
+    return array
+
+
+# the piece of each bitboard of evaluation.piece_bitboards: WHITE pawn ... king, then BLACK pawn ... king
+_BITBOARD_PIECES = np.concatenate([np.arange(1, 7), -np.arange(1, 7)]).astype(np.int8)
+
+
+def bitboards_to_array(bitboards):
+    """
+    Encodes boards given as (N, 12) piece bitboards, as returned by evaluation.piece_bitboards, like boards_to_array.
+    """
+    bytes_ = np.ascontiguousarray(bitboards, dtype=np.uint64).view(np.uint8).reshape(-1, 12, 8)
+    bits = np.unpackbits(bytes_, axis=2, bitorder="little")
+    array = np.zeros((len(bytes_), 65), dtype=np.int8)
+    array[:, :64] = (bits * _BITBOARD_PIECES[None, :, None]).sum(axis=1)
+    return array
+
+
+def array_to_bitboards(array):
+    """
+    :param array: (N, 65) int8 -- boards from boards_to_array
+    :return: (N, 12) uint64 -- the piece bitboards of every board, in the order of evaluation.piece_bitboards
+    """
+    bits = array[:, None, :64] == _BITBOARD_PIECES[None, :, None]
+    return np.packbits(bits, axis=2, bitorder="little").view("<u8")[:, :, 0]
+
+
+def occupied(array):
+    """
+    :return: (N,) uint64 -- the occupied squares of every board as a bitboard
+    """
+    return np.packbits(array[:, :64] != 0, axis=1, bitorder="little").view("<u8")[:, 0]
+
+
+def pseudo_legal_slots(array, sign):
+    """
+    Generates the pseudo-legal moves of every board for the side `sign`, without castling or en passant.
+
+    :param array: (N, 65) int8 -- boards from boards_to_array
+    :param sign: 1 for WHITE to move, -1 for BLACK
+
+    :return: (boards, slots) -- the board and slot of every move, grouped by board in increasing order
+    """
+    rows, squares = np.nonzero(sign * array[:, :64] > 0)
+    piece_types = np.abs(array[rows, squares])
+    counts = _CANDIDATE_COUNTS[sign][piece_types, squares]
+    starts = _CANDIDATE_STARTS[sign][piece_types, squares]
+
+    # one entry per candidate slot of every piece: its board and its index in the concatenated candidates
+    ends = np.cumsum(counts)
+    candidates = np.arange(ends[-1] if len(ends) else 0) + np.repeat(starts - (ends - counts), counts)
+    rows = np.repeat(rows, counts)
+    slots = _CANDIDATES[sign][candidates]
+
+    targets = np.sign(sign * array.ravel()[rows * array.shape[1] + SLOT_TO[slots]]) + 1
+    path_clear = (occupied(array)[rows] & SLOT_BETWEEN[slots]) == 0
+    usable = _ALLOWED[_CANDIDATE_CATEGORIES[sign][candidates] * 3 + targets] & path_clear
+    return rows[usable], slots[usable]
+
+
+def is_attacked(array, sign, squares):
+    """
+    :param array: (N, 65) int8 -- boards from boards_to_array
+    :param sign: the attacking side, 1 for WHITE and -1 for BLACK
+    :param squares: (N,) -- one square per board, 64 for none
+
+    :return: (N,) bool -- True where the side `sign` attacks the square of that board
+    """
+    rows = np.arange(len(array))[:, None]
+    slots = _SLOTS_INTO[squares]
+    pieces = sign * array[rows, SLOT_FROM[slots]]
+    categories = _CATEGORIES[sign][np.maximum(pieces, 0), slots]
+    # pawns attack diagonally whatever is on the square
+    attacks = (categories == _NORMAL) | (categories == _CAPTURE)
+    return (attacks & ((occupied(array)[rows] & SLOT_BETWEEN[slots]) == 0)).any(axis=1)
+
+
+def material(array, color):
+    """
+    :return: (N,) -- the material difference of every board from the point of view of color
+    """
+    return batch_material(array_to_bitboards(array), color)
+
+
+class RolloutEngine():
+    """
+    Plays random playouts for many boards at once. Like MCTS_Tree.rollout, a playout stops when a king is gone, the
+    side to move is in check or has no moves, or after max_depth plies. Pawns always promote to queens.
+    """
+
+    def __init__(self, max_depth=5, seed=None):
+        self.max_depth = max_depth
+        self.rng = np.random.default_rng(seed)
+
+
+    def rollout(self, board, num_rollouts, color):
+        """
+        :param board: chess.Board -- the position to play out from, with board.turn to move
+        :param num_rollouts: int -- the number of playouts
+        :param color: the color to score for
+
+        :return: (num_rollouts,) -- the material score of each playout's final board for color
+        """
+        return self.rollout_array(np.repeat(boards_to_array([board]), num_rollouts, axis=0), board.turn, color)
+
+
+    def rollout_array(self, array, turn, color):
+        """
+        Plays out every board of an array from boards_to_array in place, all with `turn` to move.
+
+        :return: (N,) -- the material score of each final board for color
+        """
+        sign = 1 if turn == chess.WHITE else -1
+        active = np.ones(len(array), dtype=bool)
+
+        for _ in range(self.max_depth):
+            kings = array[:, :64] == sign * chess.KING
+            has_king = kings.any(axis=1)
+            active &= has_king & (array[:, :64] == -sign * chess.KING).any(axis=1)
+            active &= ~is_attacked(array, -sign, np.where(has_king, kings.argmax(axis=1), _EMPTY_SQUARE))
+            if not active.any():
+                break
+
+            boards = np.flatnonzero(active)
+            move_boards, move_slots = pseudo_legal_slots(array[boards], sign)
+
+            # a uniformly random move per board, from the moves grouped by board
+            counts = np.bincount(move_boards, minlength=len(boards))
+            has_moves = counts > 0
+            first = np.cumsum(counts) - counts
+            picks = first + (self.rng.random(len(boards)) * counts).astype(np.intp)
+            active[boards[~has_moves]] = False
+            boards, chosen = boards[has_moves], move_slots[picks[has_moves]]
+
+            from_squares, to_squares = SLOT_FROM[chosen], SLOT_TO[chosen]
+            pieces = array[boards, from_squares]
+            promotes = (np.abs(pieces) == chess.PAWN) & ((to_squares >> 3 == 0) | (to_squares >> 3 == 7))
+            array[boards, to_squares] = np.where(promotes, sign * chess.QUEEN, pieces)
+            array[boards, from_squares] = 0
+
+            sign = -sign
+
+        return material(array, color)
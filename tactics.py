@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+"""
+File Name:      tactics.py
+Authors:        Nathan Wang + Celina Huang + Alex Vitale
+Date:           4/2/22
+
+Description:    Attack maps of our position, built once per turn, that answer the agent's immediate tactical
+                questions -- can we capture the king, which moves get us out of check, which moves give check -- for
+                whole arrays of encoded moves with bitboard intersections instead of playing each move on a board.
+"""
+
+import numpy as np
+import chess
+
+from move_encoding import from_squares, to_squares, promotions
+
+
+def attacks(piece_type, color, square, occupied):
+    """
+    :param occupied: int -- bitboard of the pieces that block sliders
+    :return: int -- bitboard of the squares a piece of piece_type and color on square attacks
+    """
+    if piece_type == chess.PAWN:
+        return chess.BB_PAWN_ATTACKS[color][square]
+    if piece_type == chess.KNIGHT:
+        return chess.BB_KNIGHT_ATTACKS[square]
+    if piece_type == chess.KING:
+        return chess.BB_KING_ATTACKS[square]
+
+    targets = 0
+    if piece_type in (chess.BISHOP, chess.QUEEN):
+        targets |= chess.BB_DIAG_ATTACKS[square][chess.BB_DIAG_MASKS[square] & occupied]
+    if piece_type in (chess.ROOK, chess.QUEEN):
+        targets |= (chess.BB_RANK_ATTACKS[square][chess.BB_RANK_MASKS[square] & occupied] |
+                    chess.BB_FILE_ATTACKS[square][chess.BB_FILE_MASKS[square] & occupied])
+    return targets
+
+
+def _bits(codes, squares):
+    return np.uint64(1) << squares(codes).astype(np.uint64)
+
+
+class TacticalMaps:
+    """
+    Everything the tactical questions need is a bitboard of the position before our move: the squares the opponent
+    attacks with our king lifted off the board, the checkers and the squares that block them, the line each pinned
+    piece must stay on, the squares from which each of our piece types attacks the opponent's king, and the lines
+    our pieces must leave to uncover a check. Castling and en passant are not considered.
+    """
+
+    def __init__(self, board, color):
+        """
+        :param board: chess.BaseBoard -- our best guess of the position
+        :param color: chess.WHITE or chess.BLACK -- the side about to move
+        """
+        self.color = color
+        self.king = board.king(color)
+        their_king = board.king(not color)
+        occupied = board.occupied
+        ours = board.occupied_co[color]
+
+        # our piece type on every square, 0 elsewhere
+        self.piece_types = np.zeros(64, dtype=np.intp)
+        for square in chess.scan_forward(ours):
+            self.piece_types[square] = board.piece_type_at(square)
+
+        self.checkers = 0
+        self.danger = 0
+        self.blocks = 0
+        # the line a pinned piece has to stay on, every square for the rest
+        self.pin_rays = np.full(64, chess.BB_ALL, dtype=np.uint64)
+        if self.king is not None:
+            self.checkers = board.attackers_mask(not color, self.king)
+            # a king stepping back along a slider's line is still attacked, so the king doesn't block
+            lifted = occupied & ~chess.BB_SQUARES[self.king]
+            for square in chess.scan_forward(board.occupied_co[not color]):
+                self.danger |= attacks(board.piece_type_at(square), not color, square, lifted)
+            if chess.popcount(self.checkers) == 1:
+                checker = chess.msb(self.checkers)
+                self.blocks = self.checkers | chess.between(self.king, checker)
+            for square in chess.scan_forward(ours & ~chess.BB_SQUARES[self.king]):
+                self.pin_rays[square] = board.pin_mask(color, square)
+
+        # squares from which each of our piece types would attack their king
+        self.check_squares = np.zeros(7, dtype=np.uint64)
+        # the same by from square, where a pawn promotes: the square it leaves no longer blocks the new piece's line to
+        # their king, as when d7d8q checks a king on d5
+        self.vacated_check_squares = np.zeros((64, 7), dtype=np.uint64)
+        # for a piece alone between one of our sliders and their king: the line it leaves to uncover a check
+        self.discovery_rays = np.zeros(64, dtype=np.uint64)
+        if their_king is not None:
+            for piece_type in chess.PIECE_TYPES:
+                self.check_squares[piece_type] = attacks(piece_type, not color, their_king, occupied)
+            self.vacated_check_squares[:] = self.check_squares
+            promoting = board.pawns & ours & (chess.BB_RANK_7 if color == chess.WHITE else chess.BB_RANK_2)
+            for square in chess.scan_forward(promoting):
+                vacated = occupied & ~chess.BB_SQUARES[square]
+                for piece_type in (chess.BISHOP, chess.ROOK, chess.QUEEN):
+                    self.vacated_check_squares[square, piece_type] = attacks(piece_type, not color, their_king, vacated)
+            for slider in chess.scan_forward(ours & (board.bishops | board.rooks | board.queens)):
+                if not attacks(board.piece_type_at(slider), color, slider, 0) & chess.BB_SQUARES[their_king]:
+                    continue
+                line = chess.between(slider, their_king)
+                if chess.popcount(line & occupied) == 1 and line & ours:
+                    self.discovery_rays[chess.msb(line & occupied)] = line
+
+    def in_check(self):
+        """
+        :return: bool -- True if our king is attacked
+        """
+        return self.checkers != 0
+
+    def king_captures(self, codes, king_square):
+        """
+        :param codes: uint16 array of our pseudo-legal moves
+        :param king_square: chess.Square -- where the opponent's king is, or None
+        :return: bool array -- True for the moves that capture it
+        """
+        if king_square is None:
+            return np.zeros(len(codes), dtype=bool)
+        return to_squares(codes) == king_square
+
+    def escapes(self, codes):
+        """
+        :param codes: uint16 array of our pseudo-legal moves, made while in check
+        :return: bool array -- True for the moves after which our king is no longer attacked
+        """
+        to_bits = _bits(codes, to_squares)
+        from_ = from_squares(codes)
+        king_moves = from_ == self.king
+        safe_king_moves = king_moves & ((to_bits & np.uint64(self.danger)) == 0)
+        # a double check can only be answered by the king
+        blocks = (~king_moves & ((to_bits & np.uint64(self.blocks)) != 0) & ((self.pin_rays[from_] & to_bits) != 0))
+        return safe_king_moves | blocks
+
+    def gives_check(self, codes):
+        """
+        :param codes: uint16 array of our pseudo-legal moves
+        :return: bool array -- True for the moves that attack their king, directly or by uncovering a slider
+        """
+        to_bits = _bits(codes, to_squares)
+        from_ = from_squares(codes)
+        promoted = promotions(codes).astype(np.intp)
+        piece_types = np.where(promoted > 0, promoted, self.piece_types[from_])
+        direct = (self.vacated_check_squares[from_, piece_types] & to_bits) != 0
+        rays = self.discovery_rays[from_]
+        discovered = (rays != 0) & ((rays & to_bits) == 0)
+        return direct | discovered
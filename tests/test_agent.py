@@ -0,0 +1,62 @@
+import time
+
+import chess
+import numpy as np
+import pytest
+
+from belief import INTERIOR_CENTERS
+from nwang309_chuang371_avitale6 import TheRookies
+
+
+@pytest.fixture
+def agent():
+    players = []
+
+    def start(color):
+        player = TheRookies()
+        player.handle_game_start(color, chess.Board())
+        players.append(player)
+        return player
+
+    yield start
+    for player in players:
+        player.release_pondering()
+        if player.search_pool is not None:
+            player.search_pool.close()
+
+
+def test_senses_the_most_informative_center(agent):
+    player = agent(chess.BLACK)
+    player.handle_opponent_move_result(False, None)
+
+    scores = player.belief.sense_scores()
+    assert scores.max() > 0
+    assert player.choose_sense(list(chess.SQUARES), [], 900) == INTERIOR_CENTERS[np.argmax(scores)]
+
+
+def test_senses_around_the_king_when_nothing_is_uncertain(agent):
+    player = agent(chess.WHITE)
+    player.handle_opponent_move_result(False, None)
+
+    assert player.belief.sense_scores().max() == 0
+    assert player.choose_sense(list(chess.SQUARES), [], 900) == chess.E7
+
+
+def test_takes_back_only_the_pondered_subtree_of_a_reply(agent):
+    player = agent(chess.WHITE)
+    player.start_pondering()
+    time.sleep(0.5)
+    player.stop_pondering()
+
+    tree = player.pondered_tree
+    replies = tree.children(tree.root)
+    reply = replies[np.argmax(tree.visits[replies])]
+    assert tree.visits[reply] > 0
+
+    subtree = player.release_pondering(reply)
+
+    assert player.ponder_process is None
+    assert subtree.root_board.board_fen() == tree.board(reply).board_fen()
+    assert subtree.visits[subtree.root] == tree.visits[reply]
+    assert len(subtree.visits) == subtree.size
+    assert subtree.table is player.transpositions
@@ -0,0 +1,23 @@
+import chess
+import numpy as np
+
+import evaluation
+import rollout_engine
+
+
+BOARDS = [chess.Board(),
+          chess.Board("r3k2r/ppp2ppp/2n5/3q4/8/2N5/PPP2PPP/R3K2R w KQkq - 0 1"),
+          chess.Board("4k3/3P4/8/8/8/8/8/4K2R w - - 0 1")]
+
+
+def test_batch_material_matches_material():
+    bitboards = evaluation.piece_bitboards(BOARDS)
+    for color in chess.COLORS:
+        expected = [evaluation.material(board, color) for board in BOARDS]
+        assert list(evaluation.batch_material(bitboards, color)) == expected
+        assert list(rollout_engine.material(rollout_engine.boards_to_array(BOARDS), color)) == expected
+
+
+def test_array_to_bitboards_inverts_bitboards_to_array():
+    bitboards = evaluation.piece_bitboards(BOARDS)
+    assert np.array_equal(rollout_engine.array_to_bitboards(rollout_engine.bitboards_to_array(bitboards)), bitboards)
@@ -0,0 +1,22 @@
+import chess
+
+from game import Game
+
+
+def test_moves_follow_the_turn_after_a_timeout():
+    game = Game()
+    game.start()
+    assert chess.Move.from_uci("e2e4") in game.get_moves()
+
+    game.took_to_long_to_move = True
+    game.handle_move(chess.Move.from_uci("e2e4"))
+    game.took_to_long_to_move = False
+    game.end_turn()
+
+    moves = game.get_moves()
+    assert chess.Move.from_uci("e7e5") in moves
+    assert chess.Move.from_uci("e2e4") not in moves
+    assert all(game.truth_board.color_at(move.from_square) == chess.BLACK for move in moves)
+
+    _, _, _, reason = game.handle_move(chess.Move.from_uci("e7e5"))
+    assert "illegal" not in reason
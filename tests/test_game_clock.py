@@ -0,0 +1,35 @@
+import chess
+
+import game_clock
+from game_clock import GameClock, NS_PER_SECOND, PLAYER_PHASES, SENSE, MOVE
+
+
+class FakeTime:
+
+    def __init__(self):
+        self.ns = 0
+
+    def perf_counter_ns(self):
+        return self.ns
+
+    def advance(self, seconds):
+        self.ns += int(seconds * NS_PER_SECOND)
+
+
+def test_turn_seconds_of_the_player_phases_leave_out_the_engine(monkeypatch):
+    clock_time = FakeTime()
+    monkeypatch.setattr(game_clock, "time", clock_time)
+    clock = GameClock()
+    clock.start(chess.WHITE)
+
+    clock_time.advance(5)
+    with clock.charging(SENSE):
+        clock_time.advance(2)
+    clock_time.advance(5)
+    with clock.charging(MOVE):
+        clock_time.advance(3)
+        assert clock.turn_seconds(PLAYER_PHASES) == 5
+    assert clock.turn_seconds() == 15
+
+    clock.start(chess.BLACK)
+    assert clock.turn_seconds(PLAYER_PHASES) == 0
@@ -0,0 +1,79 @@
+import time
+
+import chess
+import numpy as np
+
+import MCTS
+
+
+def _tree():
+    return MCTS.MCTS_Tree(state=chess.Board(), color=chess.WHITE, start_time=time.perf_counter())
+
+
+def test_reroot_keeps_a_subtree_larger_than_int16():
+    tree = _tree()
+    tree.expand(tree.root, tree.root_board)
+    kept = int(tree.children(tree.root)[0])
+
+    # synthetic blocks of 20 children, breadth first, until offsets pass the int16 range
+    pending = [kept]
+    while tree.size < 40000:
+        node = pending.pop(0)
+        tree.first_child[node] = tree._new_nodes(node, np.arange(20, dtype=np.uint16))
+        tree.num_children[node] = 20
+        pending.extend(tree.children(node))
+    tree.visits[:tree.size] = np.arange(tree.size)
+
+    def subtree(node):
+        return [int(tree.visits[node])] + sum((subtree(child) for child in tree.children(node)), [])
+
+    expected = sorted(subtree(kept))
+    tree.reroot(kept)
+
+    assert tree.size == len(expected)
+    assert sorted(subtree(tree.root)) == expected
+    assert all(tree.parent[child] == node for node in range(tree.size) for child in tree.children(node))
+
+
+def test_searches_determinizations_without_a_pool(monkeypatch):
+    searched = []
+    search_statistics = MCTS._search_statistics
+
+    def record(fen, color, seconds, table=None):
+        searched.append(fen)
+        return search_statistics(fen, color, seconds, table)
+
+    monkeypatch.setattr(MCTS, "_search_statistics", record)
+    tree = _tree()
+    tree.search_seconds = 0.4
+    determinizations = [chess.Board("rnbqkbnr/pppp1ppp/8/4p3/8/8/PPPPPPPP/RNBQKBNR"),
+                        chess.Board("rnbqkbnr/pp1ppppp/8/2p5/8/8/PPPPPPPP/RNBQKBNR")]
+    search = MCTS.RootParallelSearch(processes=0)
+
+    move = search.best_action(tree, determinizations)
+
+    assert searched == [board.fen() for board in determinizations]
+    assert move in chess.Board().legal_moves
+    assert tree.search_seconds == 0.4
+
+
+def _stall(args):
+    time.sleep(60)
+
+
+def test_late_workers_are_dropped_with_their_pool(monkeypatch):
+    monkeypatch.setattr(MCTS, "_search_worker", _stall)
+    search = MCTS.RootParallelSearch(processes=1)
+    try:
+        stalled_pool = search.pool
+        tree = _tree()
+        tree.search_seconds = 0.2
+
+        started = time.perf_counter()
+        move = search.best_action(tree)
+
+        assert move in chess.Board().legal_moves
+        assert time.perf_counter() - started < 2
+        assert search.pool is not stalled_pool
+    finally:
+        search.close()
@@ -0,0 +1,59 @@
+import os
+
+import chess
+import pytest
+
+import play_game
+from log_writer import BackgroundWriter
+from random_agent import Random
+
+
+class Crashing(Random):
+
+    def choose_move(self, possible_moves, seconds_left):
+        raise RuntimeError("crashed")
+
+
+@pytest.fixture
+def game_history(tmp_path, monkeypatch):
+    (tmp_path / "GameHistory").mkdir()
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / "GameHistory"
+
+
+def test_a_writer_passed_in_is_left_open(game_history):
+    writer = BackgroundWriter()
+    play_game.play_local_game(Random(), Random(), ["white", "black"], writer=writer)
+
+    assert writer._thread.is_alive()
+    writer.close()
+    assert all("Game Over!" in path.read_text() for path in game_history.glob("*game_boards.txt"))
+
+
+def test_logs_are_closed_when_a_player_raises(game_history, monkeypatch):
+    opened = []
+    monkeypatch.setattr(play_game, "open", lambda *args: opened.append(open(*args)) or opened[-1], raising=False)
+    writers = []
+    monkeypatch.setattr(play_game, "BackgroundWriter", lambda: writers.append(BackgroundWriter()) or writers[-1])
+
+    with pytest.raises(RuntimeError):
+        play_game.play_local_game(Crashing(), Random(), ["white", "black"])
+
+    assert len(opened) == 2 and all(out.closed for out in opened)
+    assert not writers[0]._thread.is_alive()
+
+
+def test_batch_games_are_only_recorded_for_an_archive():
+    paths = [os.path.join(os.path.dirname(play_game.__file__), "random_agent.py")] * 2
+    assert play_game._play_batch_game((paths, 0, False))["record"] is None
+    assert play_game._play_batch_game((paths, 1, True))["record"] is not None
+
+
+def test_batch_games_time_every_callback_of_each_agent():
+    paths = [os.path.join(os.path.dirname(play_game.__file__), "random_agent.py")] * 2
+    result = play_game._play_batch_game((paths, 0, False))
+
+    for seconds in result["callback_seconds"]:
+        assert set(seconds) == set(play_game.CALLBACKS)
+        assert len(seconds["handle_game_start"]) == len(seconds["handle_game_end"]) == 1
+        assert len(seconds["choose_move"]) == len(seconds["handle_move_result"]) > 0
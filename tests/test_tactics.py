@@ -0,0 +1,20 @@
+import chess
+import pytest
+
+from move_encoding import encode_moves
+from tactics import TacticalMaps
+
+
+@pytest.mark.parametrize("fen, uci", [
+    # the promoted queen checks down the file the pawn just left
+    ("8/3P4/8/3k4/8/8/8/4K3 w - - 0 1", "d7d8q"),
+    # and down the diagonal the capturing pawn just left
+    ("2r5/3P4/8/5k2/8/8/8/4K3 w - - 0 1", "d7c8q"),
+])
+def test_gives_check_past_the_square_it_leaves(fen, uci):
+    board = chess.Board(fen)
+    moves = [move for move in board.pseudo_legal_moves if not board.is_castling(move)]
+    checks = TacticalMaps(board, board.turn).gives_check(encode_moves(moves))
+
+    assert [move for move, check in zip(moves, checks) if check] == [move for move in moves if board.gives_check(move)]
+    assert chess.Move.from_uci(uci) in [move for move, check in zip(moves, checks) if check]
@@ -0,0 +1,32 @@
+import json
+
+import tournament
+
+
+def _bot(directory, name, body):
+    (directory / (name + ".py")).write_text(
+        "import random_agent\n\n\n"
+        "class {}(random_agent.Random):\n{}".format(name.title().replace("_", ""), body))
+
+
+def test_broken_bots_lose_instead_of_stopping_the_tournament(tmp_path, capsys):
+    agent_dir = tmp_path / "agents"
+    agent_dir.mkdir()
+    _bot(agent_dir, "steady_bot", "    pass\n")
+    _bot(agent_dir, "crashy_bot", "\n    def choose_move(self, possible_moves, seconds_left):\n"
+                                  "        raise ValueError('no move')\n")
+    (agent_dir / "unimportable_bot.py").write_text("import nonexistent_mod\n")
+
+    agents = tournament.find_agents(str(agent_dir))
+    assert sorted(agents) == ["crashy_bot", "steady_bot"]
+    assert "unimportable_bot.py" in capsys.readouterr().err
+
+    checkpoint = tmp_path / "results.jsonl"
+    results = tournament.run_tournament(agents, str(checkpoint), processes=1)
+
+    assert len(results) == 2 and len(checkpoint.read_text().splitlines()) == 2
+    for result in results.values():
+        assert result[result["winner"]] == "steady_bot"
+        assert "ValueError: no move" in result["reason"]
+    assert [row[:2] for row in tournament.standings(agents, results)] == [("steady_bot", 2), ("crashy_bot", 0)]
+    assert all(json.loads(line)["turns"] is None for line in checkpoint.read_text().splitlines())
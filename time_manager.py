@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+"""
+File Name:      time_manager.py
+Authors:        Nathan Wang + Celina Huang + Alex Vitale
+Date:           4/2/22
+
+Description:    Decides how long the agent searches for each move, from the time left on its clock and how sharp the
+                position is.
+"""
+
+import time
+
+
+class TimeManager:
+    """
+    Splits the clock evenly over the moves we still expect to make, then scales each move's share: more when the
+    position is tactical (a check, or a capture on the last move by either side), less when there are only a few
+    moves to choose from, and nothing when the move is forced. A move never uses more than a fraction of the clock,
+    and the whole turn stays a safety margin below the framework's per-turn limit.
+    """
+
+    def __init__(self, max_turn_seconds=60, safety_margin=0.25, expected_moves=60, min_moves_left=20,
+                 check_factor=2.0, capture_factor=1.5, few_moves_factor=0.5, max_clock_fraction=0.2):
+        """
+        :param max_turn_seconds: float -- play_game.MAX_SECONDS_PER_TURN, after which the turn's move is forfeited
+        :param safety_margin: float -- the fraction of max_turn_seconds that is never used
+        :param expected_moves: int -- the number of moves we expect to make in a game
+        :param min_moves_left: int -- the fewest moves the remaining clock is ever split over
+        """
+        self.max_turn_seconds = max_turn_seconds
+        self.safety_margin = safety_margin
+        self.expected_moves = expected_moves
+        self.min_moves_left = min_moves_left
+        self.check_factor = check_factor
+        self.capture_factor = capture_factor
+        self.few_moves_factor = few_moves_factor
+        self.max_clock_fraction = max_clock_fraction
+        self.turn_start = None
+
+    def start_turn(self):
+        """
+        Marks the start of our turn, so time spent sensing counts towards the per-turn limit.
+        """
+        self.turn_start = time.perf_counter()
+
+    def turn_seconds(self):
+        """
+        :return: float -- the seconds since start_turn, 0 if it wasn't called
+        """
+        if self.turn_start is None:
+            return 0.0
+        return time.perf_counter() - self.turn_start
+
+    def budget(self, seconds_left, moves_played, num_moves, in_check=False, recent_capture=False):
+        """
+        :param seconds_left: float -- the seconds left on our clock
+        :param moves_played: int -- the number of moves we made so far
+        :param num_moves: int -- the number of moves to choose from
+        :param in_check: bool -- True if either king is in check
+        :param recent_capture: bool -- True if a piece was captured on the last move of either side
+
+        :return: float -- the seconds to search for this move, 0 if it is forced
+        """
+        if num_moves <= 1:
+            return 0.0
+
+        moves_left = max(self.min_moves_left, self.expected_moves - moves_played)
+        seconds = seconds_left / moves_left
+        if in_check:
+            seconds *= self.check_factor
+        if recent_capture:
+            seconds *= self.capture_factor
+        if num_moves <= 3:
+            seconds *= self.few_moves_factor
+
+        turn_limit = self.max_turn_seconds * (1 - self.safety_margin) - self.turn_seconds()
+        return max(0.0, min(seconds, seconds_left * self.max_clock_fraction, turn_limit))
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+
+"""
+File Name:      tournament.py
+Authors:        Nathan Wang + Celina Huang + Alex Vitale
+Date:           4/2/22
+
+Description:    Python file used to run a resumable round robin tournament between every agent in a directory.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import chess
+from player import load_player, load_cached_player
+from play_game import play_headless_game, init_worker
+
+
+def find_agents(agent_dir):
+    """
+    Finds every python source file in `agent_dir` that contains exactly one Player subclass.
+
+    :param agent_dir: str -- directory of bot source files
+    :return: dict -- agent name (the file name without extension) to source path, sorted by name
+    """
+    agents = {}
+    for file_name in sorted(os.listdir(agent_dir)):
+        if not file_name.endswith(".py"):
+            continue
+        path = os.path.join(agent_dir, file_name)
+        try:
+            load_player(path)
+        except RuntimeError:
+            # helper modules without a player class
+            continue
+        except Exception as e:
+            # a bot that doesn't even import is left out instead of stopping the tournament
+            print("Skipping {}: {}: {}".format(path, type(e).__name__, e), file=sys.stderr)
+            continue
+        agents[os.path.splitext(file_name)[0]] = path
+    return agents
+
+
+def game_key(white, black):
+    return "{}_vs_{}".format(white, black)
+
+
+def pairings(agents):
+    """
+    :param agents: dict -- agent name to source path
+    :return: List(tuple) -- every (white, black) pair of different agents, so each pairing is played with both colors
+    """
+    return [(white, black) for white in agents for black in agents if white != black]
+
+
+def load_checkpoint(checkpoint_path):
+    """
+    Reads the results of the games that were already played. A partially written last line from an interrupted run
+    is ignored, so that game is played again.
+
+    :param checkpoint_path: str -- path to the JSON lines checkpoint file
+    :return: dict -- game key to result
+    """
+    results = {}
+    if not os.path.exists(checkpoint_path):
+        return results
+    with open(checkpoint_path) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            results[game_key(result["white"], result["black"])] = result
+    return results
+
+
+def _ends_mid_line(checkpoint_path):
+    """
+    :return: bool -- True if an interrupted run left a partial line at the end of the checkpoint
+    """
+    if not os.path.exists(checkpoint_path) or os.path.getsize(checkpoint_path) == 0:
+        return False
+    with open(checkpoint_path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b"\n"
+
+
+def _raised_by(error, players):
+    """
+    :param error: Exception -- raised while a game was played
+    :param players: dict -- color to Player, None for a player that wasn't built
+    :return: the color of the player whose method the error was raised in, innermost first, None if neither
+    """
+    culprit = None
+    traceback = error.__traceback__
+    while traceback is not None:
+        owner = traceback.tb_frame.f_locals.get("self")
+        for color, player in players.items():
+            if player is not None and owner is player:
+                culprit = color
+        traceback = traceback.tb_next
+    return culprit
+
+
+def _play_tournament_game(args):
+    """
+    Plays one tournament game in a worker process. An agent that raises, while being built or during the game, loses
+    it with the error as the reason, so one broken bot can't stop the tournament.
+
+    :return: dict -- the names of both agents, the winner ("white", "black" or None), the reason and the number of
+             turns (None if the game was cut short by an error)
+    """
+    white, white_path, black, black_path = args
+    players = {chess.WHITE: None, chess.BLACK: None}
+
+    start = time.perf_counter()
+    try:
+        players[chess.WHITE] = load_cached_player(white_path)[1]()
+        players[chess.BLACK] = load_cached_player(black_path)[1]()
+        winner_color, winner_reason, game = play_headless_game(players[chess.WHITE], players[chess.BLACK])
+        turns = len(game.truth_board.move_stack)
+    except Exception as e:
+        loser = _raised_by(e, players)
+        if loser is None and players[chess.BLACK] is None:
+            # it was raised while building the player that is still missing
+            loser = chess.WHITE if players[chess.WHITE] is None else chess.BLACK
+        winner_color = None if loser is None else not loser
+        winner_reason = "{} raised {}: {}".format(
+            chess.COLOR_NAMES[loser].upper() if loser is not None else "The game", type(e).__name__, e)
+        turns = None
+
+    winner = None
+    if winner_color is not None:
+        winner = "white" if winner_color else "black"
+    return {
+        "white": white,
+        "black": black,
+        "winner": winner,
+        "reason": winner_reason,
+        "turns": turns,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def standings(agents, results):
+    """
+    :return: List(tuple) -- (name, points, wins, losses, draws) for every agent, best first. A win is worth 1 point
+             and a draw half a point.
+    """
+    table = {name: [0, 0, 0] for name in agents}
+    for result in results.values():
+        if result["white"] not in table or result["black"] not in table:
+            continue
+        if result["winner"] is None:
+            table[result["white"]][2] += 1
+            table[result["black"]][2] += 1
+        else:
+            winner = result[result["winner"]]
+            loser = result["black" if result["winner"] == "white" else "white"]
+            table[winner][0] += 1
+            table[loser][1] += 1
+    rows = [(name, wins + 0.5 * draws, wins, losses, draws) for name, (wins, losses, draws) in table.items()]
+    return sorted(rows, key=lambda row: row[1], reverse=True)
+
+
+def run_tournament(agents, checkpoint_path, processes=None):
+    """
+    Plays every pairing of `agents` with both colors across a process pool. Each finished game is appended to the
+    checkpoint right away, and games already in the checkpoint are not played again.
+
+    :param agents: dict -- agent name to source path, as returned by find_agents
+    :param checkpoint_path: str -- path to the JSON lines checkpoint file
+    :param processes: int -- the number of worker processes, defaults to the number of CPUs
+
+    :return: dict -- game key to result, for every game of the tournament
+    """
+    results = load_checkpoint(checkpoint_path)
+
+    remaining = [(white, agents[white], black, agents[black]) for white, black in pairings(agents)
+                 if game_key(white, black) not in results]
+    print("{} agents, {} games, {} already played".format(
+        len(agents), len(pairings(agents)), len(pairings(agents)) - len(remaining)))
+
+    checkpoint_dir = os.path.dirname(checkpoint_path)
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    with open(checkpoint_path, "a") as checkpoint, \
+            multiprocessing.Pool(processes, initializer=init_worker, initargs=(list(agents.values()),)) as pool:
+        if _ends_mid_line(checkpoint_path):
+            checkpoint.write("\n")
+        for done, result in enumerate(pool.imap_unordered(_play_tournament_game, remaining), 1):
+            checkpoint.write(json.dumps(result) + "\n")
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+            results[game_key(result["white"], result["black"])] = result
+            print("[{}/{}] {} -- {}".format(done, len(remaining), game_key(result["white"], result["black"]),
+                                            result["reason"] if result["winner"] else "Draw!"))
+    elapsed = time.perf_counter() - start
+    print("Played {} games in {:.2f}s".format(len(remaining), elapsed))
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Runs a round robin tournament between every bot in a directory.')
+    parser.add_argument('agent_dir', help='Directory of bot source files.')
+    parser.add_argument('--checkpoint', default=os.path.join('RRGameHistory', 'results.jsonl'),
+                        help='File the finished games are recorded in. Rerun with the same file to resume.')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='Number of worker processes. Defaults to the number of CPUs.')
+    parser.add_argument('--exclude', nargs='*', default=[],
+                        help='Names of agents in the directory to leave out, e.g. human_agent.')
+    args = parser.parse_args()
+
+    agents = {name: path for name, path in find_agents(args.agent_dir).items() if name not in args.exclude}
+    results = run_tournament(agents, args.checkpoint, args.processes)
+
+    print("{:<40} {:>6} {:>4} {:>4} {:>4}".format("Agent", "Points", "W", "L", "D"))
+    for name, points, wins, losses, draws in standings(agents, results):
+        print("{:<40} {:>6} {:>4} {:>4} {:>4}".format(name, points, wins, losses, draws))
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+"""
+File Name:      transposition_table.py
+Authors:        Nathan Wang + Celina Huang + Alex Vitale
+Date:           4/2/22
+
+Description:    Fixed size transposition table for MCTS, keyed by the polyglot Zobrist hash of a position. It shares
+                visit and value statistics between the different move orders that reach the same position.
+"""
+
+import numpy as np
+
+
+# bytes per entry: key, visits, value sum and depth
+ENTRY_BYTES = 8 + 4 + 8 + 2
+
+
+class TranspositionTable:
+    """
+    Buckets of two entries, indexed by the low bits of the key. The first entry of a bucket keeps the most valuable
+    position that hashed there -- the one with the most visits, or the shallowest of two with the same visits -- and
+    the second always takes the newest position, so neither the well searched nor the recent positions are starved.
+    """
+
+    def __init__(self, megabytes=32):
+        num_buckets = 1
+        while 2 * (2 * num_buckets) * ENTRY_BYTES <= megabytes * 1024 * 1024:
+            num_buckets *= 2
+        self.mask = num_buckets - 1
+
+        # key 0 marks an empty entry
+        self.keys = np.zeros(2 * num_buckets, dtype=np.uint64)
+        self.visits = np.zeros(2 * num_buckets, dtype=np.int32)
+        self.value_sum = np.zeros(2 * num_buckets, dtype=np.float64)
+        self.depth = np.zeros(2 * num_buckets, dtype=np.int16)
+
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.replacements = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _bucket(self, key):
+        return (key & self.mask) * 2
+
+    def lookup(self, key):
+        """
+        :param key: int -- chess.polyglot.zobrist_hash of the position
+        :return: (visits, value sum) stored for the position, or None
+        """
+        self.probes += 1
+        key = np.uint64(key)
+        slot = self._bucket(int(key))
+        for entry in (slot, slot + 1):
+            if self.keys[entry] == key:
+                self.hits += 1
+                return int(self.visits[entry]), float(self.value_sum[entry])
+        return None
+
+    def _set(self, entry, key, depth, visits, value_sum):
+        if self.keys[entry] not in (0, key):
+            self.replacements += 1
+        self.keys[entry] = key
+        self.depth[entry] = depth
+        self.visits[entry] = visits
+        self.value_sum[entry] = value_sum
+
+    def _outranks(self, depth, visits, entry):
+        return visits > self.visits[entry] or (visits == self.visits[entry] and depth < self.depth[entry])
+
+    def store(self, key, depth, visits, value_sum):
+        """
+        Records the statistics of a position, replacing what was stored for it before.
+
+        :param key: int -- chess.polyglot.zobrist_hash of the position
+        :param depth: int -- plies from the root of the search
+        :param visits: int -- visits of the position
+        :param value_sum: float -- sum of the rewards of those visits
+        """
+        self.stores += 1
+        key = np.uint64(key)
+        slot = self._bucket(int(key))
+
+        if self.keys[slot] == key:
+            self._set(slot, key, depth, visits, value_sum)
+            return
+        if self.keys[slot + 1] == key:
+            # stored again below, possibly in the first slot
+            self.keys[slot + 1] = 0
+
+        if self.keys[slot] == 0 or self._outranks(depth, visits, slot):
+            if self.keys[slot] != 0:
+                # the entry it displaces from the first slot still gets the second one
+                self._set(slot + 1, self.keys[slot], self.depth[slot], self.visits[slot], self.value_sum[slot])
+                self.keys[slot] = 0
+            self._set(slot, key, depth, visits, value_sum)
+        else:
+            self._set(slot + 1, key, depth, visits, value_sum)
+
+    def hit_rate(self):
+        """
+        :return: float -- the fraction of lookups that found their position
+        """
+        return self.hits / self.probes if self.probes else 0.0
+
+    def __repr__(self):
+        return "TranspositionTable({} entries, {} probes, {:.1%} hits, {} stores, {} replacements)".format(
+            len(self), self.probes, self.hit_rate(), self.stores, self.replacements)